@@ -0,0 +1,163 @@
+"""
+Benchmark for the FlaskAPIClient HTTP transport.
+
+Starts the Flask API under gunicorn against a throwaway database and fetches
+pages from it, first the old way (a module-level requests.get per call, so a
+new TCP connection each time), then through FlaskAPIClient's pooled
+keep-alive sessions, bypassing the cache, and prints requests per second and
+p50/p99 latency for each. Over loopback the saving is the TCP handshake and
+socket setup per call; between containers, or with TLS, it is larger. The
+API runs on the same machine, so leave it some cores:
+
+    python bench_client.py [--threads 4] [--seconds 5] [--workers 2]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+API_KEY = "bench"
+FLASK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "flask-api")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+
+def seed(url, pages):
+    import requests
+
+    story = {
+        "story": {"title": "Benchmark", "status": "published"},
+        "pages": [
+            {"ref": i, "text": f"Page {i}. " + "Lorem ipsum dolor sit amet. " * 8,
+             "choices": [{"text": "Go on", "next": (i + 1) % pages}]}
+            for i in range(pages)
+        ],
+    }
+    response = requests.post(
+        f"{url}/stories/import",
+        data=json.dumps(story),
+        headers={"Content-Type": "application/json", "X-API-KEY": API_KEY},
+    )
+    response.raise_for_status()
+    return list(response.json()["page_ids"].values())
+
+
+def run(fetch, page_ids, threads, seconds):
+    results = []
+
+    def worker():
+        rng = random.Random()
+        latencies, errors = [], 0
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            started = time.perf_counter()
+            if not fetch(rng.choice(page_ids)):
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        results.append((latencies, errors))
+
+    # start the clock once every thread is ready
+    deadline = []
+    start = threading.Barrier(threads, action=lambda: deadline.append(time.perf_counter() + seconds))
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    latencies = [value for values, _ in results for value in values]
+    return {
+        "per_second": len(latencies) / seconds,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": sum(errors for _, errors in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=4, help="concurrent client threads")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for the API")
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-client-")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    os.environ["FLASK_API_URL"] = url
+    os.environ["FLASK_API_KEY"] = API_KEY
+    os.environ["DB_NAME"] = os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoproject.settings")
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi:app",
+         "--workers", str(args.workers), "--bind", f"127.0.0.1:{port}"],
+        cwd=FLASK_DIR,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'api.db')}"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(port)
+        page_ids = seed(url, args.pages)
+
+        import django
+
+        django.setup()
+
+        import requests
+
+        from djangoApp.flask_api import flask_api
+
+        def per_call(page_id):
+            # what every FlaskAPIClient method used to do
+            response = requests.get(f"{url}/pages/{page_id}", timeout=flask_api.timeout)
+            return response.status_code == 200
+
+        def pooled(page_id):
+            return flask_api._fetch_page(page_id) is not None
+
+        print(f"{args.threads} client threads, {args.workers} API workers")
+        for label, fetch in (("per-call requests.get", per_call), ("pooled session", pooled)):
+            r = run(fetch, page_ids, args.threads, args.seconds)
+            print(
+                f"{label:22} {r['per_second']:8,.0f} req/s  "
+                f"p50 {r['p50_ms']:6.2f} ms  p99 {r['p99_ms']:7.2f} ms  "
+                f"{r['errors']} errors"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark for the Play, PlaySession and Report indexes (migration 0003).
+
+Seeds a throwaway SQLite database with 1M plays (plus ratings, reports and
+play sessions), drops the indexes migration 0003 added, and times the
+per-story lookups behind the stats and story_detail views and the reader's
+resume and history lookups; then creates the indexes again and repeats.
+Prints each query's plan and its median and p99 latency. stats and
+story_detail now read the StoryStats/EndingStats rollups, but the same Play
+queries rebuild them (stats.rebuild_stats) and back the funnel reports:
+
+    python bench_indexes.py [--plays 1000000] [--stories 1000] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+INDEXES = {
+    "Play": ["play_story_ending_idx", "play_user_created_idx"],
+    "PlaySession": ["playsession_key_story_idx"],
+    "Report": ["report_story_idx"],
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def insert_rows(model, columns, rows, batch=50000):
+    from django.db import connection, transaction
+
+    table = model._meta.db_table
+    sql = (
+        f'INSERT INTO "{table}" ({", ".join(columns)}) '
+        f'VALUES ({", ".join("%s" for _ in columns)})'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == batch:
+                cursor.executemany(sql, chunk)
+                chunk = []
+        if chunk:
+            cursor.executemany(sql, chunk)
+
+
+def seed(args):
+    from django.contrib.auth.models import User
+
+    from djangoApp.models import Play, PlaySession, Rating, Report
+
+    rng = random.Random(1)
+    User.objects.bulk_create(
+        [User(username=f"reader{i}", password="") for i in range(args.users)],
+        batch_size=1000,
+    )
+    user_ids = list(User.objects.values_list("id", flat=True))
+    now = datetime(2026, 1, 1)
+
+    def when(i):
+        return str(now + timedelta(seconds=i))
+
+    # a few endings per story; pages are numbered story_id * 1000 + n
+    insert_rows(
+        Play,
+        ["story_id", "ending_page_id", "user_id", "path", "created_at"],
+        (
+            (story, story * 1000 + rng.randint(1, 5), rng.choice(user_ids), b"", when(i))
+            for i in range(args.plays)
+            for story in [rng.randint(1, args.stories)]
+        ),
+    )
+    pairs = rng.sample(range(args.stories * len(user_ids)), args.plays // 10)
+    insert_rows(
+        Rating,
+        ["story_id", "user_id", "rating", "comment"],
+        ((p % args.stories + 1, user_ids[p // args.stories], rng.randint(1, 5), "")
+         for p in pairs),
+    )
+    insert_rows(
+        Report,
+        ["story_id", "user_id", "reason", "description", "status", "moderator_notes"],
+        ((rng.randint(1, args.stories), rng.choice(user_ids), "spam", "", "pending", "")
+         for _ in range(args.plays // 100)),
+    )
+    insert_rows(
+        PlaySession,
+        ["session_key", "story_id", "current_page_id", "path", "created_at", "updated_at"],
+        ((f"session{i % (args.plays // 50)}", rng.randint(1, args.stories), 1, b"",
+          when(i), when(i))
+         for i in range(args.plays // 10)),
+    )
+    return user_ids
+
+
+def queries(args, user_ids):
+    from django.db.models import Avg, Count
+
+    from djangoApp.models import Play, PlaySession, Rating, Report
+
+    def story():
+        return random.randint(1, args.stories)
+
+    return {
+        "stats endings": lambda: Play.objects.filter(story_id=story())
+        .values("ending_page_id").annotate(count=Count("id")),
+        "stats totals": lambda: Play.objects.filter(story_id=story()).values("story_id")
+        .annotate(total=Count("id"), players=Count("user", distinct=True)),
+        "detail ratings": lambda: Rating.objects.filter(story_id=story()).values("story_id")
+        .annotate(avg=Avg("rating"), count=Count("id")),
+        "detail reports": lambda: Report.objects.filter(story_id=story()),
+        "play resume": lambda: PlaySession.objects.filter(
+            session_key=f"session{random.randrange(args.plays // 50)}", story_id=story()
+        ),
+        "my_history": lambda: Play.objects.filter(user_id=random.choice(user_ids))
+        .order_by("-created_at")[:20],
+    }
+
+
+def measure(label, named_queries, repeat):
+    print(f"\n{label}")
+    for name, build in named_queries.items():
+        plan = build().explain().replace("\n", "; ")
+        latencies = []
+        for _ in range(repeat):
+            qs = build()
+            started = time.perf_counter()
+            list(qs)
+            latencies.append(time.perf_counter() - started)
+        print(
+            f"  {name:15} p50 {percentile(latencies, 50) * 1000:8.2f} ms  "
+            f"p99 {percentile(latencies, 99) * 1000:8.2f} ms  {plan}"
+        )
+
+
+def set_indexes(create):
+    from django.apps import apps
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for model_name, names in INDEXES.items():
+            model = apps.get_model("djangoApp", model_name)
+            for index in model._meta.indexes:
+                if index.name in names:
+                    (editor.add_index if create else editor.remove_index)(model, index)
+    # fresh planner statistics for the tables and whichever indexes exist
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--plays", type=int, default=1_000_000)
+    parser.add_argument("--stories", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=50, help="runs of each query")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-indexes-")
+    os.environ["DB_NAME"] = os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoproject.settings")
+
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    random.seed(1)
+
+    started = time.perf_counter()
+    user_ids = seed(args)
+    print(
+        f"seeded {args.plays:,} plays over {args.stories} stories and "
+        f"{len(user_ids)} users in {time.perf_counter() - started:.1f}s"
+    )
+
+    named_queries = queries(args, user_ids)
+    set_indexes(create=False)
+    measure("without indexes", named_queries, args.repeat)
+
+    started = time.perf_counter()
+    set_indexes(create=True)
+    print(f"\ncreated indexes in {time.perf_counter() - started:.1f}s")
+    measure("with indexes", named_queries, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
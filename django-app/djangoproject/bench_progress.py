@@ -0,0 +1,129 @@
+"""
+Benchmark for reader progress tracking in play_page.
+
+Serves page clicks through the Django test client against a throwaway SQLite
+database, first writing every click through to PlaySession, then with the
+write-behind flush (see djangoApp/progress.py), and prints clicks per second:
+
+    python bench_progress.py [--readers 8] [--clicks 500]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+
+def build_graph(story_id, pages):
+    """A synthetic story graph, as FlaskAPIClient.get_story_graph returns it"""
+    story = {
+        "id": story_id,
+        "title": "Benchmark",
+        "status": "published",
+        "start_page_id": 1,
+        "author_id": None,
+        "version": 1,
+    }
+    return {
+        "story": story,
+        "pages": {
+            page_id: {
+                "id": page_id,
+                "page_number": page_id,
+                "story_id": story_id,
+                "text": f"Page {page_id}. " + "Lorem ipsum dolor sit amet. " * 8,
+                "is_ending": False,
+                "ending_label": None,
+                "choices": [
+                    {"id": page_id, "text": "Go on", "next_page_id": page_id % pages + 1}
+                ],
+            }
+            for page_id in range(1, pages + 1)
+        },
+        "version": 1,
+        "compiled_version": None,
+        "entry": {"data": story, "etag": None},
+        "checked_at": float("inf"),  # never revalidate against Flask
+    }
+
+
+def run(readers, clicks, pages):
+    from django.db import connection
+    from django.test import Client
+
+    errors = []
+
+    def click(client, path):
+        try:
+            response = client.get(path)
+            if response.status_code not in (200, 302):
+                errors.append(response.status_code)
+        except Exception as e:  # e.g. "database is locked" under write contention
+            errors.append(e)
+
+    def reader(client):
+        for i in range(clicks):
+            click(client, f"/play/1/page/{i % pages + 1}/")
+        connection.close()
+
+    # start every session up front so all readers have one to save progress to
+    clients = [Client(raise_request_exception=True) for _ in range(readers)]
+    for client in clients:
+        client.get("/play/1/?resume=false")
+
+    threads = [threading.Thread(target=reader, args=(client,)) for client in clients]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        print(f"  {len(errors)} failed requests, first: {errors[0]!r}")
+    return (readers * clicks - len(errors)) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8, help="concurrent readers")
+    parser.add_argument("--clicks", type=int, default=500, help="clicks per reader")
+    parser.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-progress-")
+    os.environ["DB_NAME"] = os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoproject.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    from djangoApp import progress
+    from djangoApp.flask_api import flask_api
+    from djangoApp.models import PlaySession
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    # lock timeouts are counted below; don't print a traceback for each one
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    call_command("migrate", verbosity=0)
+    flask_api._graphs[1] = build_graph(1, args.pages)
+
+    with override_settings(PLAY_PROGRESS_WRITE_BEHIND=False):
+        rate = run(args.readers, args.clicks, args.pages)
+    print(f"write-through: {rate:,.0f} clicks/s")
+
+    PlaySession.objects.all().delete()
+    with override_settings(PLAY_PROGRESS_WRITE_BEHIND=True):
+        rate = run(args.readers, args.clicks, args.pages)
+        flushed = progress.flush()
+    print(f"write-behind:  {rate:,.0f} clicks/s ({flushed} rows in the final flush)")
+    print(f"sessions saved: {PlaySession.objects.count()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,334 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import requests
 from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class FlaskBatch:
+    """
+    Write operations collected by FlaskAPIClient.batch(). Each create returns
+    a "$ref" string that later operations in the same batch can use in place
+    of the new row's id.
+    """
+
+    def __init__(self):
+        self.operations = []
+        self.results = None
+        self.error = None
+
+    def _add(self, op, kind, data=None, **ids):
+        item = {"op": op, "type": kind, **ids}
+        if data is not None:
+            item["data"] = data
+        if op == "create":
+            item["ref"] = f"op{len(self.operations)}"
+        self.operations.append(item)
+        return f"${item['ref']}" if op == "create" else None
+
+    def create_story(self, title, description="", status="draft", author_id=None, tags=None):
+        return self._add(
+            "create",
+            "story",
+            {
+                "title": title,
+                "description": description,
+                "status": status,
+                "author_id": author_id,
+                "tags": tags if tags else [],
+            },
+        )
+
+    def update_story(self, story_id, **kwargs):
+        self._add("update", "story", kwargs, id=story_id)
+
+    def delete_story(self, story_id):
+        self._add("delete", "story", id=story_id)
+
+    def create_page(self, story_id, text, is_ending=False, ending_label=None):
+        return self._add(
+            "create",
+            "page",
+            {"text": text, "is_ending": is_ending, "ending_label": ending_label},
+            story_id=story_id,
+        )
+
+    def update_page(self, page_id, **kwargs):
+        self._add("update", "page", kwargs, id=page_id)
+
+    def delete_page(self, page_id):
+        self._add("delete", "page", id=page_id)
+
+    def create_choice(self, page_id, text, next_page_id):
+        return self._add(
+            "create",
+            "choice",
+            {"text": text, "next_page_id": next_page_id},
+            page_id=page_id,
+        )
+
+    def update_choice(self, choice_id, **kwargs):
+        self._add("update", "choice", kwargs, id=choice_id)
+
+    def delete_choice(self, choice_id):
+        self._add("delete", "choice", id=choice_id)
 
 
 class FlaskAPIClient:
     def __init__(self):
         self.url = settings.FLASK_API_URL
         self.key = settings.FLASK_API_KEY
+        self.pool_size = getattr(settings, "FLASK_API_POOL_SIZE", 10)
+        self.timeout = (
+            getattr(settings, "FLASK_API_CONNECT_TIMEOUT", 3),
+            getattr(settings, "FLASK_API_TIMEOUT", 10),
+        )
+        self.retries = getattr(settings, "FLASK_API_RETRIES", 2)
+        self.backoff = getattr(settings, "FLASK_API_RETRY_BACKOFF", 0.2)
+        self.bulk_chunk_size = getattr(settings, "FLASK_API_BULK_CHUNK_SIZE", 200)
+        self.cache_alias = getattr(settings, "FLASK_API_CACHE_ALIAS", "default")
+        self.cache_ttl = getattr(settings, "FLASK_API_CACHE_TTL", 30)
+        self.cache_stale_ttl = getattr(settings, "FLASK_API_CACHE_STALE_TTL", 3600)
+        self.graph_cache_size = getattr(settings, "FLASK_API_GRAPH_CACHE_SIZE", 100)
+        self.graph_check_interval = getattr(
+            settings, "FLASK_API_GRAPH_CHECK_INTERVAL", 5
+        )
+        # requests.Session is not thread-safe, so each worker thread gets its
+        # own keep-alive session (and connection pool)
+        self._local = threading.local()
+        # whole-story graphs for gameplay, kept in-process (LRU by story id)
+        self._graphs = OrderedDict()
+        self._graphs_lock = threading.Lock()
+
+    def _make_session(self):
+        session = requests.Session()
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._make_session()
+            self._local.session = session
+        return session
+
+    def _request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self._session().request(method, f"{self.url}{path}", **kwargs)
+
+    # read-through cache for story content
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _story_keys(self, story_id):
+        return [
+            f"flaskapi:story:{story_id}",
+            f"flaskapi:story:{story_id}:pages",
+            f"flaskapi:story:{story_id}:start",
+            f"flaskapi:story:{story_id}:analysis",
+        ]
+
+    def _page_key(self, page_id):
+        return f"flaskapi:page:{page_id}"
+
+    def _compiled_key(self, story_id, version):
+        return f"flaskapi:compiled:{story_id}:{version}"
+
+    def _cached(self, key, fetch):
+        """
+        Serve fresh entries from the cache. Once an entry is past its TTL it is
+        kept (up to the stale TTL) only to revalidate it with its ETag, so an
+        unchanged story costs a 304 instead of a full body.
+        """
+        entry = self.cache.get(key)
+        if entry and entry["fresh_until"] > time.time():
+            return entry["data"]
+
+        result = fetch(entry)
+        # errors and 404s come back as None and are never cached
+        if result is None:
+            return None
+        data, etag = result
+        self.cache.set(
+            key,
+            {"data": data, "etag": etag, "fresh_until": time.time() + self.cache_ttl},
+            self.cache_stale_ttl,
+        )
+        return data
+
+    def _conditional_get(self, path, entry=None, **kwargs):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        response = self._request("GET", path, headers=headers, **kwargs)
+        if response.status_code == 304 and entry:
+            return entry["data"], entry["etag"]
+        data = self._handle_response(response)
+        if not data:
+            return None
+        return data, response.headers.get("ETag")
+
+    def invalidate_story(self, story_id):
+        """Drop the cached story (with and without pages) and its start page"""
+        if story_id is not None:
+            self.cache.delete_many(self._story_keys(story_id))
+            self.drop_story_graph(story_id)
+
+    def forget_story(self, story_id):
+        """
+        invalidate_story() for a deleted story, also dropping the compiled
+        snapshots cached for it (they never expire on their own)
+        """
+        if story_id is None:
+            return
+        versions = set()
+        entry = self.cache.get(f"flaskapi:story:{story_id}")
+        if entry:
+            versions.add(entry["data"].get("compiled_version"))
+        with self._graphs_lock:
+            graph = self._graphs.get(int(story_id))
+        if graph:
+            versions.add(graph["compiled_version"])
+        versions.discard(None)
+        self.cache.delete_many(
+            [self._compiled_key(story_id, version) for version in versions]
+        )
+        self.invalidate_story(story_id)
+
+    # in-process story graphs for gameplay
+
+    def drop_story_graph(self, story_id):
+        with self._graphs_lock:
+            self._graphs.pop(int(story_id), None)
+
+    def get_story_graph(self, story_id):
+        """
+        The whole story (pages, choices, endings) as
+        {"story": {...}, "pages": {page_id: page}, "version": n}, held in
+        process memory. Freshness is rechecked at most every
+        graph_check_interval seconds with a conditional GET of the story,
+        which Flask answers with a 304 when the story version has not moved.
+        Published stories are loaded from their immutable compiled snapshot;
+        drafts from the live story.
+        """
+        story_id = int(story_id)
+        with self._graphs_lock:
+            graph = self._graphs.get(story_id)
+            if graph:
+                self._graphs.move_to_end(story_id)
+
+        now = time.time()
+        if graph and graph["checked_at"] + self.graph_check_interval > now:
+            return graph
+
+        result = self._fetch_story(story_id, False, graph and graph["entry"])
+        if result is None:
+            self.drop_story_graph(story_id)
+            return None
+
+        story, etag = result
+        if graph and story is graph["story"]:
+            graph["checked_at"] = now  # 304: still current
+            return graph
+
+        compiled_version = None
+        if story.get("status") == "published":
+            compiled_version = story.get("compiled_version")
+        if graph and compiled_version and compiled_version == graph["compiled_version"]:
+            pages = graph["pages"]
+        elif compiled_version:
+            pages = self.get_compiled_story(story_id, compiled_version)
+        else:
+            pages = None
+        if pages is None:
+            result = self._fetch_story(story_id, True)
+            if result is None:
+                self.drop_story_graph(story_id)
+                return None
+            pages = {p["id"]: p for p in result[0].get("pages") or []}
+            compiled_version = None
+
+        graph = {
+            "story": story,
+            "pages": pages,
+            "version": story.get("version"),
+            "compiled_version": compiled_version,
+            "entry": {"data": story, "etag": etag},
+            "checked_at": now,
+        }
+        with self._graphs_lock:
+            self._graphs[story_id] = graph
+            self._graphs.move_to_end(story_id)
+            while len(self._graphs) > self.graph_cache_size:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def get_compiled_story(self, story_id, version):
+        """
+        Pages of a compiled story snapshot as {page_id: page}, in the same
+        shape as get_story(include_pages=True). Snapshots never change, so
+        they are cached without expiry; None if it cannot be fetched.
+        """
+        key = self._compiled_key(story_id, version)
+        doc = self.cache.get(key)
+        if doc is None:
+            try:
+                response = self._request(
+                    "GET", f"/stories/{story_id}/compiled/{version}"
+                )
+                doc = self._handle_response(response)
+            except Exception as e:
+                print(f"Error fetching compiled story {story_id} v{version}: {e}")
+                return None
+            if not doc or doc.get("format") != 1:
+                return None
+            self.cache.set(key, doc, None)
+
+        pages = {}
+        for number, (page_id, text, is_ending, ending_label, choices) in enumerate(
+            doc["pages"], start=1
+        ):
+            pages[page_id] = {
+                "id": page_id,
+                "page_number": number,
+                "story_id": story_id,
+                "text": text,
+                "is_ending": is_ending,
+                "ending_label": ending_label,
+                "choices": [
+                    {"id": choice_id, "text": choice_text, "next_page_id": next_page_id}
+                    for choice_id, choice_text, next_page_id in choices
+                ],
+            }
+        return pages
+
+    def invalidate_page(self, page_id, story_id=None):
+        """Drop a cached page and the cached story graph that contains it"""
+        if story_id is None:
+            entry = self.cache.get(self._page_key(page_id))
+            story_id = entry["data"].get("story_id") if entry else None
+        self.cache.delete(self._page_key(page_id))
+        self.invalidate_story(story_id)
 
     def _get_head(self, include_auth=False):
         headers = {"Content-Type": "application/json"}
@@ -28,7 +351,7 @@ class FlaskAPIClient:
 
     # read endpoints
 
-    def get_stories(self, status=None, search=None, tags=None):
+    def _story_filters(self, status=None, search=None, tags=None, tag_mode=None):
         params = {}
         if status:
             params["status"] = status
@@ -36,10 +359,22 @@ class FlaskAPIClient:
             params["search"] = search
         if tags:
             params["tags"] = tags
+        if tag_mode:
+            params["tag_mode"] = tag_mode
+        return params
+
+    def get_stories(
+        self, status=None, search=None, tags=None, author_id=None, include=None
+    ):
+        params = self._story_filters(status, search, tags)
+        if author_id is not None:
+            params["author_id"] = author_id
+        if include:
+            params["include"] = include
 
         try:
-            response = requests.get(
-                f"{self.url}/stories", params=params, timeout=10
+            response = self._request(
+                "GET", "/stories", params=params
             )  # ------------------------------
             data = self._handle_response(response)
             return data if data else []
@@ -47,43 +382,136 @@ class FlaskAPIClient:
             print(f"Error fetching stories: {e}")
             return []
 
+    def get_stories_page(
+        self,
+        status=None,
+        search=None,
+        tags=None,
+        tag_mode=None,
+        limit=20,
+        after_id=None,
+    ):
+        """
+        One page of the story listing (newest first, or best match first when
+        searching). Pass the returned next_after_id, an opaque cursor, back as
+        after_id to get the following page.
+        """
+        params = self._story_filters(status, search, tags, tag_mode)
+        params["limit"] = limit
+        if after_id:
+            params["after_id"] = after_id
+
+        try:
+            response = self._request("GET", "/stories", params=params)
+            data = self._handle_response(response)
+            next_after_id = response.headers.get("X-Next-After-Id")
+            return {
+                "stories": data if data else [],
+                "total": int(response.headers.get("X-Total-Count", 0)),
+                "next_after_id": next_after_id or None,
+            }
+        except Exception as e:
+            print(f"Error fetching stories page: {e}")
+            return {"stories": [], "total": 0, "next_after_id": None}
+
+    def get_tags(self, status=None):
+        """[{"name": ..., "count": ...}] most used first, for tag facets"""
+        try:
+            params = {"status": status} if status else {}
+            response = self._request("GET", "/tags", params=params)
+            data = self._handle_response(response)
+            return data if data else []
+        except Exception as e:
+            print(f"Error fetching tags: {e}")
+            return []
+
     def get_story(self, story_id, include_pages=False):
+        key = self._story_keys(story_id)[1 if include_pages else 0]
+        return self._cached(
+            key, lambda entry: self._fetch_story(story_id, include_pages, entry)
+        )
+
+    def _fetch_story(self, story_id, include_pages, entry=None):
         try:
             params = {"include_pages": "true"} if include_pages else {}
-            response = requests.get(
-                f"{self.url}/stories/{story_id}", params=params, timeout=10
-            )
-            return self._handle_response(response)
+            return self._conditional_get(f"/stories/{story_id}", entry, params=params)
         except Exception as e:
             print(f"Error fetching story {story_id}: {e}")
             return None
 
+    def get_story_analysis(self, story_id):
+        """Reachability, dead ends, loops and path lengths for the story graph"""
+        key = self._story_keys(story_id)[3]
+        return self._cached(
+            key, lambda entry: self._fetch_story_analysis(story_id, entry)
+        )
+
+    def _fetch_story_analysis(self, story_id, entry=None):
+        try:
+            return self._conditional_get(f"/stories/{story_id}/analysis", entry)
+        except Exception as e:
+            print(f"Error fetching analysis of story {story_id}: {e}")
+            return None
+
     def get_story_start(self, story_id):
+        key = self._story_keys(story_id)[2]
+        return self._cached(key, lambda entry: self._fetch_story_start(story_id, entry))
+
+    def _fetch_story_start(self, story_id, entry=None):
         try:
-            response = requests.get(f"{self.url}/stories/{story_id}/start", timeout=10)
-            data = self._handle_response(response)
-            if not data:
-                return None
-            return data
+            return self._conditional_get(f"/stories/{story_id}/start", entry)
         except Exception as e:
             print(f"Error fecthing start of story {story_id}: {e}")
             return None
 
     def get_page(self, page_id):
+        return self._cached(
+            self._page_key(page_id), lambda entry: self._fetch_page(page_id, entry)
+        )
+
+    def _fetch_page(self, page_id, entry=None):
         try:
-            response = requests.get(f"{self.url}/pages/{page_id}", timeout=10)
-            return self._handle_response(response)
+            return self._conditional_get(f"/pages/{page_id}", entry)
         except Exception as e:
             print(f"Error fecthing page {page_id}: {e}")
             return None
 
+    def _unique_ids(self, ids):
+        return list(dict.fromkeys(int(i) for i in ids if i is not None))
+
+    def _bulk_chunks(self, ids):
+        """
+        De-duplicated ids split into ?ids= lists short enough for the API's
+        request line limit (gunicorn's limit_request_line, 4094 bytes)
+        """
+        ids = self._unique_ids(ids)
+        return [ids[i:i + self.bulk_chunk_size] for i in range(0, len(ids), self.bulk_chunk_size)]
+
+    def _get_bulk(self, path, ids, label):
+        found = {}
+        for chunk in self._bulk_chunks(ids):
+            try:
+                response = self._request(
+                    "GET", path, params={"ids": ",".join(str(i) for i in chunk)}
+                )
+                data = self._handle_response(response) or []
+                found.update((item["id"], item) for item in data)
+            except Exception as e:
+                print(f"Error fetching {label} {chunk}: {e}")
+        return found
+
+    def get_stories_bulk(self, story_ids):
+        """Fetch many stories in a few calls, returned as {story_id: story}"""
+        return self._get_bulk("/stories", story_ids, "stories")
+
+    def get_pages_bulk(self, page_ids):
+        """Fetch many pages (with choices) in a few calls, returned as {page_id: page}"""
+        return self._get_bulk("/pages", page_ids, "pages")
+
     def get_story_tree(self, story_id: int):
 
         try:
-            response = requests.get(
-                f"{self.base_url}/stories/{story_id}/tree",
-                timeout=10
-            )
+            response = self._request("GET", f"/stories/{story_id}/tree")
             return self._handle_response(response)
         except Exception as e:
             print(f"Error fetching story tree {story_id}: {e}")
@@ -91,6 +519,52 @@ class FlaskAPIClient:
 
     # writing endpoints
 
+    @contextmanager
+    def batch(self):
+        """
+        Collect writes and send them as one POST /batch when the block exits,
+        applied by Flask in a single transaction:
+
+            with flask_api.batch() as batch:
+                page = batch.create_page(story_id, "...")
+                batch.create_choice(page, "Go on", next_page_id=other_id)
+            batch.results  # per-operation results, or None if it failed
+
+        On failure nothing is applied and batch.error holds the message.
+        """
+        batch = FlaskBatch()
+        yield batch
+        if batch.operations:
+            self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        try:
+            response = self._request(
+                "POST",
+                "/batch",
+                json={"operations": batch.operations},
+                headers=self._get_head(include_auth=True),
+            )
+            result = self._handle_response(response)
+        except Exception as e:
+            print(f"Error applying batch: {e}")
+            batch.error = str(e)
+            return
+        if not result:
+            # a 404 names the missing story/page/choice and its operation
+            batch.error = response.json().get("error", "API Error: HTTP 404")
+            return
+
+        batch.results = result["results"]
+        self.cache.delete_many(
+            [self._page_key(page_id) for page_id in result.get("page_ids", [])]
+        )
+        for story_id in result.get("story_ids", []):
+            self.invalidate_story(story_id)
+        for op in batch.operations:
+            if op["op"] == "delete" and op["type"] == "story":
+                self.forget_story(op["id"])
+
     def create_story(
         self, title, description="", status="draft", author_id=None, tags=None
     ):
@@ -102,11 +576,11 @@ class FlaskAPIClient:
                 "author_id": author_id,
                 "tags": tags if tags else [],
             }
-            response = requests.post(
-                f"{self.url}/stories",
+            response = self._request(
+                "POST",
+                "/stories",
                 json=data,
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
             result = self._handle_response(response)
             if not result:
@@ -123,12 +597,13 @@ class FlaskAPIClient:
 
     def update_story(self, story_id, **kwargs):
         try:
-            response = requests.put(
-                f"{self.url}/stories/{story_id}",
+            response = self._request(
+                "PUT",
+                f"/stories/{story_id}",
                 json=kwargs,
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
+            self.invalidate_story(story_id)
             result = self._handle_response(response)
             if not result:
                 return None
@@ -142,11 +617,12 @@ class FlaskAPIClient:
 
     def delete_story(self, story_id):
         try:
-            response = requests.delete(
-                f"{self.url}/stories/{story_id}",
+            response = self._request(
+                "DELETE",
+                f"/stories/{story_id}",
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
+            self.forget_story(story_id)
             return response.status_code == 200
         except Exception as e:
             print(f"Error deleteing story {story_id}: {e}")
@@ -160,12 +636,13 @@ class FlaskAPIClient:
                 "ending_label": ending_label,
             }
 
-            response = requests.post(
-                f"{self.url}/stories/{story_id}/pages",
+            response = self._request(
+                "POST",
+                f"/stories/{story_id}/pages",
                 json=data,
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
+            self.invalidate_story(story_id)
             result = self._handle_response(response)
             if not result:
                 return None
@@ -180,43 +657,52 @@ class FlaskAPIClient:
 
     def update_page(self, page_id, **kwargs):
         try:
-            response = requests.put(
-                f"{self.url}/pages/{page_id}",
+            response = self._request(
+                "PUT",
+                f"/pages/{page_id}",
                 json=kwargs,
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
             result = self._handle_response(response)
+            self.invalidate_page(page_id, result.get("story_id") if result else None)
             return result if result else None
         except Exception as e:
             print(f"Error updating page {page_id} : {e}")
             return None
 
-    def delete_page(self, page_id):
+    def delete_page(self, page_id, story_id=None):
         try:
-            response = requests.delete(
-                f"{self.url}/pages/{page_id}",
+            response = self._request(
+                "DELETE",
+                f"/pages/{page_id}",
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
-            return response.status_code == 200
+            self.invalidate_page(page_id, story_id)
+            if response.status_code != 200:
+                return False
+            # pages that linked here lost their choice to it
+            self.cache.delete_many(
+                [self._page_key(linked) for linked in response.json().get("page_ids", [])]
+            )
+            return True
         except Exception as e:
             print(f"Error deleteing page {page_id}: {e}")
             return False
 
-    def create_choice(self, page_id, text, next_page_id):
+    def create_choice(self, page_id, text, next_page_id, story_id=None):
         try:
             data = {
                 "text": text,
                 "next_page_id": next_page_id,
             }
 
-            response = requests.post(
-                f"{self.url}/pages/{page_id}/choices",
+            response = self._request(
+                "POST",
+                f"/pages/{page_id}/choices",
                 json=data,
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
+            self.invalidate_page(page_id, story_id)
             result = self._handle_response(response)
             if not result:
                 return None
@@ -230,27 +716,33 @@ class FlaskAPIClient:
             print(f"Error creating choice: {e}")
             return None
 
-    def update_choice(self, choice_id, **kwargs):
+    def update_choice(self, choice_id, story_id=None, **kwargs):
         try:
-            response = requests.put(
-                f"{self.url}/choices/{choice_id}",
+            response = self._request(
+                "PUT",
+                f"/choices/{choice_id}",
                 json=kwargs,
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
             result = self._handle_response(response)
+            if result:
+                self.invalidate_page(result.get("page_id"), story_id)
             return result if result else None
         except Exception as e:
             print(f"Error updating choice {choice_id} : {e}")
             return None
 
-    def delete_choice(self, choice_id):
+    def delete_choice(self, choice_id, page_id=None, story_id=None):
         try:
-            response = requests.delete(
-                f"{self.url}/choices/{choice_id}",
+            response = self._request(
+                "DELETE",
+                f"/choices/{choice_id}",
                 headers=self._get_head(include_auth=True),
-                timeout=10,
             )
+            if page_id is not None:
+                self.invalidate_page(page_id, story_id)
+            else:
+                self.invalidate_story(story_id)
             return response.status_code == 200
         except Exception as e:
             print(f"Error deleteing choice {choice_id}: {e}")
@@ -0,0 +1,190 @@
+import asyncio
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from .flask_api import flask_api
+
+
+class AsyncFlaskAPIClient:
+    """
+    Coroutine versions of the FlaskAPIClient reads the async views use, on
+    top of httpx, so they can fan out independent calls with asyncio.gather.
+    Cache keys, filters and response handling are the sync client's, so both
+    clients share cached entries. In-flight requests per event loop are
+    capped by FLASK_API_ASYNC_CONCURRENCY.
+    """
+
+    def __init__(self):
+        self.api = flask_api
+        self.concurrency = getattr(settings, "FLASK_API_ASYNC_CONCURRENCY", 10)
+        # an httpx.AsyncClient (and a semaphore) is bound to the event loop it
+        # was created on, so keep one per running loop. Served over ASGI that
+        # is one loop, and one connection pool, per worker process.
+        self._loop_state = weakref.WeakKeyDictionary()
+
+    async def _client_for_loop(self):
+        connect, read = self.api.timeout
+        client = httpx.AsyncClient(
+            base_url=self.api.url,
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(
+                max_connections=self.api.pool_size,
+                max_keepalive_connections=self.api.pool_size,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=self.api.retries),
+        )
+        try:
+            yield client
+        finally:
+            # run by the loop's shutdown_asyncgens(): under WSGI every request
+            # gets its own loop (async_to_sync), which closes the client with it
+            await client.aclose()
+
+    async def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None:
+            owner = self._client_for_loop()
+            client = await owner.__anext__()
+            state = (owner, client, asyncio.Semaphore(self.concurrency))
+            self._loop_state[loop] = state
+        return state
+
+    async def _request(self, method, path, **kwargs):
+        _, client, semaphore = await self._state()
+        async with semaphore:
+            return await client.request(method, path, **kwargs)
+
+    # read-through cache (async cache API), see FlaskAPIClient._cached
+
+    async def _cached(self, key, fetch):
+        entry = await self.api.cache.aget(key)
+        if entry and entry["fresh_until"] > time.time():
+            return entry["data"]
+
+        result = await fetch(entry)
+        if result is None:
+            return None
+        data, etag = result
+        await self.api.cache.aset(
+            key,
+            {"data": data, "etag": etag, "fresh_until": time.time() + self.api.cache_ttl},
+            self.api.cache_stale_ttl,
+        )
+        return data
+
+    async def _conditional_get(self, path, entry=None, **kwargs):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        response = await self._request("GET", path, headers=headers, **kwargs)
+        if response.status_code == 304 and entry:
+            return entry["data"], entry["etag"]
+        data = self.api._handle_response(response)
+        if not data:
+            return None
+        return data, response.headers.get("ETag")
+
+    # read endpoints
+
+    async def get_stories(
+        self, status=None, search=None, tags=None, author_id=None, include=None
+    ):
+        params = self.api._story_filters(status, search, tags)
+        if author_id is not None:
+            params["author_id"] = author_id
+        if include:
+            params["include"] = include
+        try:
+            response = await self._request("GET", "/stories", params=params)
+            data = self.api._handle_response(response)
+            return data if data else []
+        except Exception as e:
+            print(f"Error fetching stories: {e}")
+            return []
+
+    async def get_story(self, story_id, include_pages=False):
+        key = self.api._story_keys(story_id)[1 if include_pages else 0]
+        return await self._cached(
+            key, lambda entry: self._fetch_story(story_id, include_pages, entry)
+        )
+
+    async def _fetch_story(self, story_id, include_pages, entry=None):
+        try:
+            params = {"include_pages": "true"} if include_pages else {}
+            return await self._conditional_get(
+                f"/stories/{story_id}", entry, params=params
+            )
+        except Exception as e:
+            print(f"Error fetching story {story_id}: {e}")
+            return None
+
+    async def get_story_analysis(self, story_id):
+        """Reachability, dead ends, loops and path lengths for the story graph"""
+        key = self.api._story_keys(story_id)[3]
+        return await self._cached(
+            key, lambda entry: self._fetch_story_analysis(story_id, entry)
+        )
+
+    async def _fetch_story_analysis(self, story_id, entry=None):
+        try:
+            return await self._conditional_get(f"/stories/{story_id}/analysis", entry)
+        except Exception as e:
+            print(f"Error fetching analysis of story {story_id}: {e}")
+            return None
+
+    async def get_story_start(self, story_id):
+        key = self.api._story_keys(story_id)[2]
+        return await self._cached(
+            key, lambda entry: self._fetch_story_start(story_id, entry)
+        )
+
+    async def _fetch_story_start(self, story_id, entry=None):
+        try:
+            return await self._conditional_get(f"/stories/{story_id}/start", entry)
+        except Exception as e:
+            print(f"Error fetching start of story {story_id}: {e}")
+            return None
+
+    async def get_page(self, page_id):
+        return await self._cached(
+            self.api._page_key(page_id), lambda entry: self._fetch_page(page_id, entry)
+        )
+
+    async def _fetch_page(self, page_id, entry=None):
+        try:
+            return await self._conditional_get(f"/pages/{page_id}", entry)
+        except Exception as e:
+            print(f"Error fetching page {page_id}: {e}")
+            return None
+
+    async def _get_chunk(self, path, chunk, label):
+        try:
+            response = await self._request(
+                "GET", path, params={"ids": ",".join(str(i) for i in chunk)}
+            )
+            return self.api._handle_response(response) or []
+        except Exception as e:
+            print(f"Error fetching {label} {chunk}: {e}")
+            return []
+
+    async def _get_bulk(self, path, ids, label):
+        # chunked like FlaskAPIClient._get_bulk, the chunks fetched concurrently
+        chunks = await asyncio.gather(
+            *(self._get_chunk(path, chunk, label) for chunk in self.api._bulk_chunks(ids))
+        )
+        return {item["id"]: item for data in chunks for item in data}
+
+    async def get_stories_bulk(self, story_ids):
+        """Fetch many stories in a few calls, returned as {story_id: story}"""
+        return await self._get_bulk("/stories", story_ids, "stories")
+
+    async def get_pages_bulk(self, page_ids):
+        """Fetch many pages in a few calls, returned as {page_id: page}"""
+        return await self._get_bulk("/pages", page_ids, "pages")
+
+
+async_flask_api = AsyncFlaskAPIClient()
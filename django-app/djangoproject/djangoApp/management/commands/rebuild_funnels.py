@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from djangoApp.stats import rebuild_funnels
+
+
+class Command(BaseCommand):
+    help = "Rebuild the PageStats/ChoiceStats funnel rollups from recorded play paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "story_ids", nargs="*", type=int, help="Only rebuild these stories"
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_funnels(options["story_ids"] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt funnels for {count} stories"))
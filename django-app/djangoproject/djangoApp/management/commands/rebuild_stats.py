@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from djangoApp.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the StoryStats/EndingStats rollups from the Play table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "story_ids", nargs="*", type=int, help="Only rebuild these stories"
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_stats(options["story_ids"] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {count} stories"))
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoApp', '0002_report_rating'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='play',
+            index=models.Index(fields=['story_id', 'ending_page_id'], name='play_story_ending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='play',
+            index=models.Index(fields=['user', '-created_at'], name='play_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playsession',
+            index=models.Index(fields=['session_key', 'story_id'], name='playsession_key_story_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['story_id'], name='report_story_idx'),
+        ),
+    ]
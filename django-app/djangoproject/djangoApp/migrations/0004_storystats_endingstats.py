@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_stats(apps, schema_editor):
+    # counts only; `manage.py rebuild_stats` also fills in ending labels
+    Play = apps.get_model('djangoApp', 'Play')
+    StoryStats = apps.get_model('djangoApp', 'StoryStats')
+    EndingStats = apps.get_model('djangoApp', 'EndingStats')
+
+    StoryStats.objects.bulk_create([
+        StoryStats(**row)
+        for row in Play.objects.values('story_id').annotate(
+            total_plays=Count('id'), unique_players=Count('user', distinct=True)
+        )
+    ])
+    EndingStats.objects.bulk_create([
+        EndingStats(**row)
+        for row in Play.objects.values('story_id', 'ending_page_id').annotate(count=Count('id'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoApp', '0003_story_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField(unique=True)),
+                ('total_plays', models.IntegerField(default=0)),
+                ('unique_players', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EndingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField()),
+                ('ending_page_id', models.IntegerField()),
+                ('ending_label', models.CharField(blank=True, max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('story_id', 'ending_page_id')},
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoApp', '0004_storystats_endingstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='play',
+            name='path',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='playsession',
+            name='path',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.CreateModel(
+            name='ChoiceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField()),
+                ('page_id', models.IntegerField()),
+                ('next_page_id', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('story_id', 'page_id', 'next_page_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PageStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField()),
+                ('page_id', models.IntegerField()),
+                ('visits', models.IntegerField(default=0)),
+                ('exits', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('story_id', 'page_id')},
+            },
+        ),
+    ]
@@ -6,9 +6,17 @@ class Play(models.Model):
     ending_page_id = models.IntegerField()
     user = models.ForeignKey(User, on_delete=models.CASCADE, null = True, blank=True,
                              related_name='plays')
+    path = models.BinaryField(default=b'', blank=True)  # pages visited, see paths.py
     created_at = models.DateTimeField(auto_now_add=True)
 
-    #decide whether to add meta class or not.
+    class Meta:
+        indexes = [
+            # stats / story_detail: filter by story, group by ending
+            models.Index(fields=['story_id', 'ending_page_id'], name='play_story_ending_idx'),
+            # my_history: a user's plays, newest first
+            models.Index(fields=['user', '-created_at'], name='play_user_created_idx'),
+        ]
+
     def __str__(self):
         user_info = f"User {self.user.username}" if self.user else 'Anonymous'
         return f"Play #{self.id} - Story{self.story_id} by {user_info}"
@@ -19,9 +27,15 @@ class PlaySession(models.Model):
     current_page_id = models.IntegerField()
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True,
                              blank=True, related_name='play_sessions')
+    path = models.BinaryField(default=b'', blank=True)  # pages visited so far
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_key', 'story_id'], name='playsession_key_story_idx'),
+        ]
+
     def __str__(self):
         return f"Session {self.session_key} - Story {self.story_id} at Page {self.current_page_id}"
     
@@ -96,8 +110,58 @@ class Report(models.Model):
     class Meta:
         verbose_name = 'Report'
         verbose_name_plural = 'Reports'
+        indexes = [
+            models.Index(fields=['story_id'], name='report_story_idx'),
+        ]
     
     def __str__(self):
         return f"Report #{self.id} - Story {self.story_id} by {self.user.username}"
 
-#class for path tracking
\ No newline at end of file
+class StoryStats(models.Model):
+    """Per-story play rollup, kept current by stats.write_plays"""
+    story_id = models.IntegerField(unique=True)
+    total_plays = models.IntegerField(default=0)
+    unique_players = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Story {self.story_id}: {self.total_plays} plays"
+
+class EndingStats(models.Model):
+    """Per-ending play count, with the ending label cached from Flask"""
+    story_id = models.IntegerField()
+    ending_page_id = models.IntegerField()
+    ending_label = models.CharField(max_length=100, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['story_id', 'ending_page_id']]
+
+    def __str__(self):
+        return f"Story {self.story_id} ending {self.ending_page_id}: {self.count}"
+
+class PageStats(models.Model):
+    """Per-page funnel rollup built from play paths by stats.rebuild_funnels"""
+    story_id = models.IntegerField()
+    page_id = models.IntegerField()
+    visits = models.IntegerField(default=0)
+    exits = models.IntegerField(default=0)  # abandoned playthroughs that stopped here
+
+    class Meta:
+        unique_together = [['story_id', 'page_id']]
+
+    def __str__(self):
+        return f"Story {self.story_id} page {self.page_id}: {self.visits} visits"
+
+class ChoiceStats(models.Model):
+    """How often readers went from one page to the next (the choice taken)"""
+    story_id = models.IntegerField()
+    page_id = models.IntegerField()
+    next_page_id = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [['story_id', 'page_id', 'next_page_id']]
+
+    def __str__(self):
+        return f"Story {self.story_id} {self.page_id} -> {self.next_page_id}: {self.count}"
@@ -0,0 +1,33 @@
+# Playthrough paths (the page ids a reader went through, in order) are stored
+# as one blob per play: each page id as the zigzag-encoded difference from
+# the previous one, written as a LEB128 varint. Page ids within a story are
+# close together, so most steps take one or two bytes.
+
+
+def encode_path(page_ids):
+    out = bytearray()
+    previous = 0
+    for page_id in page_ids:
+        delta = page_id - previous
+        previous = page_id
+        value = (delta << 1) ^ (delta >> 63)  # zigzag: small +/- deltas stay small
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_path(blob):
+    page_ids = []
+    previous = 0
+    value = shift = 0
+    for byte in blob or b"":
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte & 0x80:
+            continue
+        previous += (value >> 1) ^ -(value & 1)
+        page_ids.append(previous)
+        value = shift = 0
+    return page_ids
@@ -0,0 +1,187 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .stats import write_plays
+
+# Finished playthroughs are queued in process and written by a background
+# thread with stats.write_plays, every FLUSH_MS or as soon as BATCH_SIZE plays
+# are waiting. Each play is also appended to a spool file before record()
+# returns; a spool segment is deleted once its plays are committed. Segments
+# left behind by a process that died are adopted and written by the next
+# recorder to start (at-least-once: a crash between the commit and the delete
+# writes that batch twice).
+
+
+class PlayRecorder:
+    def __init__(self):
+        self.batch_size = getattr(settings, "PLAY_RECORDER_BATCH_SIZE", 200)
+        self.flush_interval = getattr(settings, "PLAY_RECORDER_FLUSH_MS", 250) / 1000
+        self.spool_dir = str(
+            getattr(settings, "PLAY_RECORDER_SPOOL_DIR", settings.BASE_DIR / "spool")
+        )
+        self.fsync = getattr(settings, "PLAY_RECORDER_FSYNC", False)
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # a forked child starts with an empty queue and its own spool files
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._run_id = uuid.uuid4().hex[:8]
+        self._buffer = []
+        self._paths = []  # closed spool segments holding the buffered plays
+        self._spool = None
+        self._segment = 0
+        self._thread = None
+
+    def buffered(self):
+        return getattr(settings, "PLAY_RECORDER_BUFFERED", True)
+
+    def record(self, event, wait=False):
+        """
+        Queue one play. Returns None, or with wait=True (or buffering turned
+        off) writes it straight away and returns the Play.
+        """
+        if wait or not self.buffered():
+            return write_plays([event])[0]
+
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            if self._spool is None:
+                self._spool = open(self._segment_path(), "a")
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._buffer.append(event)
+            backlog = len(self._buffer)
+        self._start()
+        if backlog >= self.batch_size:
+            self._wakeup.set()
+        return None
+
+    def flush(self):
+        """Write every queued play now; returns how many were written"""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+            paths, self._paths = self._paths, []
+            if self._spool is not None:
+                paths.append(self._spool.name)
+                self._spool.close()
+                self._spool = None
+        if not events:
+            self._remove(paths)
+            return 0
+
+        try:
+            write_plays(events)
+        except Exception:
+            # keep them (and their spool segments) for the next attempt
+            with self._lock:
+                self._buffer[:0] = events
+                self._paths[:0] = paths
+            raise
+        self._remove(paths)
+        return len(events)
+
+    def _segment_path(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._segment += 1
+        name = f"plays-{os.getpid()}-{self._run_id}-{self._segment}.jsonl"
+        return os.path.join(self.spool_dir, name)
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _adopt_orphans(self):
+        """Queue the plays from spool segments of processes that are gone"""
+        with self._lock:
+            own = set(self._paths)
+            if self._spool is not None:
+                own.add(self._spool.name)
+            for path in sorted(glob.glob(os.path.join(self.spool_dir, "plays-*.jsonl"))):
+                pid = int(os.path.basename(path).split("-")[1])
+                if path in own or (pid != os.getpid() and _alive(pid)):
+                    continue
+                # renaming claims the segment, so only one recorder adopts it
+                claimed = self._segment_path()
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    continue
+                with open(claimed) as f:
+                    events = [json.loads(line) for line in f if line.strip()]
+                self._buffer[:0] = events
+                self._paths.append(claimed)
+
+    def _run(self):
+        try:
+            self._adopt_orphans()
+        except Exception as e:
+            print(f"Error recovering spooled plays: {e}")
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing plays: {e}")
+            finally:
+                close_old_connections()
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="play-recorder", daemon=True
+                )
+                self._thread.start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+play_recorder = PlayRecorder()
+atexit.register(play_recorder.flush)
+
+
+def record_play(
+    story_id, ending_page_id, user=None, ending_label=None, path=None, wait=False
+):
+    """
+    Record a finished playthrough and count it in the story/ending rollups.
+    Buffered: returns None and the Play is written with the next batch, so
+    stats trail by up to PLAY_RECORDER_FLUSH_MS. Pass wait=True when the
+    caller needs the Play (and its id) back. path is the list of page ids
+    the reader went through, ending included.
+    """
+    return play_recorder.record(
+        {
+            "story_id": story_id,
+            "ending_page_id": ending_page_id,
+            "user_id": user.id if user else None,
+            "ending_label": ending_label or "",
+            "path": list(path or []),
+        },
+        wait=wait,
+    )
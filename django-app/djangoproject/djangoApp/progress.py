@@ -0,0 +1,212 @@
+import atexit
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import PlaySession
+from .paths import encode_path, decode_path
+
+# Reader progress (the pages a session has visited in each story, the last
+# one being where it is now; see paths.py for the stored form). With write-behind
+# on, a page click only updates the cache and an in-process pending map; a
+# background thread persists the map to PlaySession every FLUSH_INTERVAL
+# seconds (or once FLUSH_BATCH entries are waiting), so repeated clicks in one
+# story coalesce into a single row write. Pending entries are also flushed at
+# interpreter exit. PlaySession stays the durable copy used to resume once the
+# cached entry is gone.
+
+_pending = {}  # (session_key, story_id) -> (path, or None to clear, user_id)
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = None
+
+
+def _reset():
+    # a forked worker starts with nothing pending and no flusher thread
+    global _pending, _lock, _wakeup, _flusher
+    _pending = {}
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _flusher = None
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def _write_behind():
+    return getattr(settings, "PLAY_PROGRESS_WRITE_BEHIND", True)
+
+
+def _cache():
+    return caches[getattr(settings, "PLAY_PROGRESS_CACHE_ALIAS", "default")]
+
+
+def _key(session_key, story_id):
+    return f"progress:{session_key}:{story_id}"
+
+
+def current_path(session_key, story_id):
+    """Pages visited so far in the session's current playthrough (maybe [])"""
+    if not session_key:
+        return []
+    if _write_behind():
+        # the cache first: with several worker processes sharing it, it has
+        # the latest click even when another process handled that click
+        cached = _cache().get(_key(session_key, story_id))
+        if cached is not None:
+            return cached  # [] marks a finished playthrough
+        with _lock:
+            pending = _pending.get((session_key, story_id))
+        if pending:
+            return list(pending[0] or [])
+    saved = (
+        PlaySession.objects.filter(session_key=session_key, story_id=story_id)
+        .values_list("current_page_id", "path")
+        .first()
+    )
+    if not saved:
+        return []
+    # sessions saved before paths were recorded only know the current page
+    return decode_path(saved[1]) or [saved[0]]
+
+
+def current_page(session_key, story_id):
+    """The page to resume the story on, or None"""
+    path = current_path(session_key, story_id)
+    return path[-1] if path else None
+
+
+def save_progress(session_key, story_id, page_id, user=None, restart=False):
+    """Move the session to page_id, adding it to the playthrough's path"""
+    if not session_key:
+        return
+    path = [] if restart else current_path(session_key, story_id)
+    if path and path[-1] == page_id:
+        return  # a reload, not a new step
+    path.append(page_id)
+    path = path[-getattr(settings, "PLAY_PATH_MAX_LENGTH", 1000):]
+
+    if not _write_behind():
+        PlaySession.objects.update_or_create(
+            session_key=session_key,
+            story_id=story_id,
+            defaults={"current_page_id": page_id, "path": encode_path(path), "user": user},
+        )
+        return
+    _queue(session_key, story_id, path, user.id if user else None)
+
+
+def clear_progress(session_key, story_id, page_id=None):
+    """
+    End the session's playthrough (it reached an ending) and return its path,
+    finishing with page_id if given.
+    """
+    if not session_key:
+        return [page_id] if page_id else []
+    path = current_path(session_key, story_id)
+    if page_id and (not path or path[-1] != page_id):
+        path.append(page_id)
+    if not _write_behind():
+        PlaySession.objects.filter(session_key=session_key, story_id=story_id).delete()
+    else:
+        _queue(session_key, story_id, None, None)
+    return path
+
+
+def _queue(session_key, story_id, path, user_id):
+    timeout = getattr(settings, "PLAY_PROGRESS_CACHE_TTL", 86400)
+    _cache().set(_key(session_key, story_id), path or [], timeout)
+    with _lock:
+        _pending[(session_key, story_id)] = (path, user_id)
+        backlog = len(_pending)
+    _start_flusher()
+    if backlog >= getattr(settings, "PLAY_PROGRESS_FLUSH_BATCH", 500):
+        _wakeup.set()
+
+
+def flush():
+    """Write every pending progress entry to PlaySession; returns how many"""
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+
+    try:
+        _persist(batch)
+    except Exception:
+        # put them back unless a newer click replaced them meanwhile
+        with _lock:
+            for key, value in batch.items():
+                _pending.setdefault(key, value)
+        raise
+    return len(batch)
+
+
+def _persist(batch):
+    session_keys = {session_key for session_key, _ in batch}
+    story_ids = {story_id for _, story_id in batch}
+    with transaction.atomic():
+        existing = {
+            (s.session_key, s.story_id): s
+            for s in PlaySession.objects.filter(
+                session_key__in=session_keys, story_id__in=story_ids
+            )
+        }
+        now = timezone.now()
+        to_create, to_update, to_delete = [], [], []
+        for (session_key, story_id), (path, user_id) in batch.items():
+            row = existing.get((session_key, story_id))
+            if path is None:
+                if row:
+                    to_delete.append(row.id)
+            elif row:
+                row.current_page_id = path[-1]
+                row.path = encode_path(path)
+                row.user_id = user_id
+                row.updated_at = now
+                to_update.append(row)
+            else:
+                to_create.append(
+                    PlaySession(
+                        session_key=session_key,
+                        story_id=story_id,
+                        current_page_id=path[-1],
+                        path=encode_path(path),
+                        user_id=user_id,
+                    )
+                )
+        if to_delete:
+            PlaySession.objects.filter(id__in=to_delete).delete()
+        PlaySession.objects.bulk_update(
+            to_update, ["current_page_id", "path", "user", "updated_at"], batch_size=500
+        )
+        PlaySession.objects.bulk_create(to_create, batch_size=500)
+
+
+def _run():
+    interval = getattr(settings, "PLAY_PROGRESS_FLUSH_INTERVAL", 5)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception as e:
+            print(f"Error flushing play progress: {e}")
+        finally:
+            close_old_connections()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run, name="play-progress", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
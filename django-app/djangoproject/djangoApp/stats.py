@@ -0,0 +1,234 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .flask_api import flask_api
+from .models import Play, PlaySession, StoryStats, EndingStats, PageStats, ChoiceStats
+from .paths import encode_path, decode_path
+
+
+def write_plays(events):
+    """
+    Insert a batch of plays and bump the story/ending rollups for all of them
+    in one transaction: one bulk insert plus one update per story and ending
+    touched, instead of a write per play. Returns the Play rows in order.
+    """
+    pairs = {(e["story_id"], e["user_id"]) for e in events if e["user_id"]}
+    with transaction.atomic():
+        seen = set()
+        if pairs:
+            seen = set(
+                Play.objects.filter(
+                    story_id__in={story_id for story_id, _ in pairs},
+                    user_id__in={user_id for _, user_id in pairs},
+                )
+                .values_list("story_id", "user_id")
+                .distinct()
+            )
+
+        plays = Play.objects.bulk_create(
+            [
+                Play(
+                    story_id=e["story_id"],
+                    ending_page_id=e["ending_page_id"],
+                    user_id=e["user_id"],
+                    path=encode_path(e.get("path") or []),
+                )
+                for e in events
+            ],
+            batch_size=500,
+        )
+
+        story_totals = Counter(e["story_id"] for e in events)
+        new_players = Counter(story_id for story_id, _ in pairs - seen)
+        for story_id, count in story_totals.items():
+            StoryStats.objects.get_or_create(story_id=story_id)
+            StoryStats.objects.filter(story_id=story_id).update(
+                total_plays=F("total_plays") + count,
+                unique_players=F("unique_players") + new_players[story_id],
+            )
+
+        ending_totals = Counter((e["story_id"], e["ending_page_id"]) for e in events)
+        labels = {(e["story_id"], e["ending_page_id"]): e["ending_label"] for e in events}
+        for (story_id, ending_page_id), count in ending_totals.items():
+            EndingStats.objects.get_or_create(
+                story_id=story_id,
+                ending_page_id=ending_page_id,
+                defaults={"ending_label": labels[story_id, ending_page_id]},
+            )
+            EndingStats.objects.filter(
+                story_id=story_id, ending_page_id=ending_page_id
+            ).update(count=F("count") + count)
+
+    return plays
+
+
+def ending_stats_for(story_id, total_plays):
+    """Ending distribution rows in the shape the templates and JSON API expect"""
+    ending_stats = []
+    for ending in EndingStats.objects.filter(story_id=story_id).order_by("-count"):
+        percentage = (ending.count / total_plays * 100) if total_plays > 0 else 0
+        ending_stats.append(
+            {
+                "ending_page_id": ending.ending_page_id,
+                "ending_label": ending.ending_label or None,
+                "count": ending.count,
+                "percentage": round(percentage, 1),
+            }
+        )
+    return ending_stats
+
+
+def rebuild_stats(story_ids=None):
+    """Recompute StoryStats/EndingStats from the raw Play rows"""
+    plays = Play.objects.all()
+    if story_ids:
+        plays = plays.filter(story_id__in=story_ids)
+
+    story_totals = list(
+        plays.values("story_id").annotate(
+            total_plays=Count("id"), unique_players=Count("user", distinct=True)
+        )
+    )
+    ending_totals = list(
+        plays.values("story_id", "ending_page_id").annotate(count=Count("id"))
+    )
+    pages = flask_api.get_pages_bulk(e["ending_page_id"] for e in ending_totals)
+
+    with transaction.atomic():
+        if story_ids:
+            StoryStats.objects.filter(story_id__in=story_ids).delete()
+            EndingStats.objects.filter(story_id__in=story_ids).delete()
+        else:
+            StoryStats.objects.all().delete()
+            EndingStats.objects.all().delete()
+
+        StoryStats.objects.bulk_create(
+            [StoryStats(**row) for row in story_totals], batch_size=500
+        )
+        EndingStats.objects.bulk_create(
+            [
+                EndingStats(
+                    story_id=e["story_id"],
+                    ending_page_id=e["ending_page_id"],
+                    ending_label=(pages.get(e["ending_page_id"]) or {}).get("ending_label")
+                    or "",
+                    count=e["count"],
+                )
+                for e in ending_totals
+            ],
+            batch_size=500,
+        )
+
+    return len(story_totals)
+
+
+def rebuild_funnels(story_ids=None):
+    """
+    Recompute the PageStats/ChoiceStats funnel rollups from the recorded
+    paths: finished plays, plus sessions idle for FUNNEL_ABANDON_AFTER hours,
+    whose last page counts as an exit. Streams the paths, so memory grows
+    with the number of pages, not plays.
+    """
+    cutoff = timezone.now() - timedelta(
+        hours=getattr(settings, "FUNNEL_ABANDON_AFTER", 24)
+    )
+    plays = Play.objects.exclude(path=b"")
+    abandoned = PlaySession.objects.filter(updated_at__lt=cutoff).exclude(path=b"")
+    if story_ids:
+        plays = plays.filter(story_id__in=story_ids)
+        abandoned = abandoned.filter(story_id__in=story_ids)
+
+    visits = Counter()
+    exits = Counter()
+    choices = Counter()
+
+    def count(story_id, path):
+        for page_id in set(path):
+            visits[story_id, page_id] += 1
+        for page_id, next_page_id in zip(path, path[1:]):
+            choices[story_id, page_id, next_page_id] += 1
+
+    for story_id, blob in plays.values_list("story_id", "path").iterator(chunk_size=2000):
+        count(story_id, decode_path(blob))
+    for story_id, blob in abandoned.values_list("story_id", "path").iterator(
+        chunk_size=2000
+    ):
+        path = decode_path(blob)
+        count(story_id, path)
+        exits[story_id, path[-1]] += 1
+
+    with transaction.atomic():
+        if story_ids:
+            PageStats.objects.filter(story_id__in=story_ids).delete()
+            ChoiceStats.objects.filter(story_id__in=story_ids).delete()
+        else:
+            PageStats.objects.all().delete()
+            ChoiceStats.objects.all().delete()
+
+        PageStats.objects.bulk_create(
+            [
+                PageStats(
+                    story_id=story_id,
+                    page_id=page_id,
+                    visits=n,
+                    exits=exits[story_id, page_id],
+                )
+                for (story_id, page_id), n in visits.items()
+            ],
+            batch_size=500,
+        )
+        ChoiceStats.objects.bulk_create(
+            [
+                ChoiceStats(
+                    story_id=story_id, page_id=page_id, next_page_id=next_page_id, count=n
+                )
+                for (story_id, page_id, next_page_id), n in choices.items()
+            ],
+            batch_size=500,
+        )
+
+    return len({story_id for story_id, _ in visits})
+
+
+def funnel_for(story_id):
+    """
+    Per-page funnel rows, most visited first: how many playthroughs reached
+    the page (also as a share of the busiest page, normally the start), how
+    many readers gave up there, and which choices were taken from it.
+    """
+    pages = list(PageStats.objects.filter(story_id=story_id).order_by("-visits", "page_id"))
+    if not pages:
+        return []
+
+    taken = {}
+    for c in ChoiceStats.objects.filter(story_id=story_id).order_by("-count"):
+        taken.setdefault(c.page_id, []).append(c)
+
+    top = pages[0].visits
+    funnel = []
+    for p in pages:
+        page_choices = taken.get(p.page_id, [])
+        total = sum(c.count for c in page_choices)
+        funnel.append(
+            {
+                "page_id": p.page_id,
+                "visits": p.visits,
+                "reached": round(p.visits / top * 100, 1) if top else 0,
+                "exits": p.exits,
+                "exit_rate": round(p.exits / p.visits * 100, 1) if p.visits else 0,
+                "choices": [
+                    {
+                        "next_page_id": c.next_page_id,
+                        "count": c.count,
+                        "percentage": round(c.count / total * 100, 1),
+                    }
+                    for c in page_choices
+                ],
+            }
+        )
+    return funnel
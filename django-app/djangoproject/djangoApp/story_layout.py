@@ -0,0 +1,164 @@
+from collections import deque
+
+from django.core.cache import cache
+
+# Layered (Sugiyama-style) layout for the story map. Layers are BFS depths from
+# the start page, so every forward choice spans exactly one layer and no dummy
+# nodes are needed; choices that go back up or sideways are drawn but do not
+# take part in ordering. Results are cached per story version.
+LEVEL_SEPARATION = 330
+NODE_SPACING = 360
+SWEEPS = 4
+
+
+def _layers(page_ids, start_id, adjacency):
+    depth = {}
+    roots = [start_id] if start_id in adjacency else []
+    # pages nobody can reach get laid out from their own roots, in id order
+    roots += [p for p in page_ids if p != start_id]
+    for root in roots:
+        if root in depth:
+            continue
+        depth[root] = 0
+        queue = deque([root])
+        while queue:
+            u = queue.popleft()
+            for v in adjacency[u]:
+                if v not in depth:
+                    depth[v] = depth[u] + 1
+                    queue.append(v)
+    layers = {}
+    for p in page_ids:
+        layers.setdefault(depth[p], []).append(p)
+    return [layers[d] for d in sorted(layers)], depth
+
+
+def _order(layers, depth, adjacency, previous):
+    """
+    Barycenter crossing reduction. Given the previous version's layout, keep
+    its order and only re-sort the layers holding pages that are new or whose
+    links changed.
+    """
+    parents = {p: [] for layer in layers for p in layer}
+    children = {p: [] for layer in layers for p in layer}
+    for u, targets in adjacency.items():
+        for v in targets:
+            if depth[v] == depth[u] + 1:
+                children[u].append(v)
+                parents[v].append(u)
+    signatures = {
+        p: (depth[p], tuple(sorted(parents[p])), tuple(sorted(children[p])))
+        for p in parents
+    }
+
+    previous_order = previous["order"] if previous else {}
+    layers = [
+        sorted(layer, key=lambda p: (previous_order.get(p, float("inf")), p))
+        for layer in layers
+    ]
+    position = {p: i for layer in layers for i, p in enumerate(layer)}
+    if previous:
+        old = previous["signatures"]
+        dirty = {
+            d
+            for d, layer in enumerate(layers)
+            if any(old.get(p) != signatures[p] for p in layer)
+        }
+    else:
+        dirty = set(range(len(layers)))
+
+    def sweep(indices, neighbours):
+        for d in indices:
+            if d not in dirty:
+                continue
+            layer = layers[d]
+            keys = {}
+            for p in layer:
+                linked = neighbours[p]
+                keys[p] = (
+                    sum(position[q] for q in linked) / len(linked)
+                    if linked
+                    else position[p]
+                )
+            layer.sort(key=lambda p: (keys[p], position[p]))
+            for i, p in enumerate(layer):
+                position[p] = i
+
+    for _ in range(SWEEPS):
+        sweep(range(1, len(layers)), parents)
+        sweep(range(len(layers) - 2, -1, -1), children)
+    return layers, parents, signatures
+
+
+def _coordinates(layers, parents):
+    """Place each node under its parents, then push overlapping nodes apart."""
+    x = {}
+    for layer in layers:
+        wanted = []
+        for p in layer:
+            linked = [x[q] for q in parents[p] if q in x]
+            wanted.append(sum(linked) / len(linked) if linked else None)
+        # nodes without placed parents sit next to their left neighbour
+        placed = []
+        for i, p in enumerate(layer):
+            target = wanted[i]
+            if target is None:
+                target = placed[-1] + NODE_SPACING if placed else 0
+            if placed and target < placed[-1] + NODE_SPACING:
+                target = placed[-1] + NODE_SPACING
+            placed.append(target)
+        # keep each layer centred on where its nodes wanted to be
+        desired = [w for w in wanted if w is not None]
+        shift = 0
+        if desired:
+            shift = sum(desired) / len(desired) - sum(placed) / len(placed)
+        elif placed:
+            shift = -(placed[0] + placed[-1]) / 2
+        for p, px in zip(layer, placed):
+            x[p] = round(px + shift)
+    return {
+        p: {"x": x[p], "y": d * LEVEL_SEPARATION, "level": d}
+        for d, layer in enumerate(layers)
+        for p in layer
+    }
+
+
+def compute_layout(pages, start_id, previous=None):
+    page_ids = [p["id"] for p in pages]
+    known = set(page_ids)
+    adjacency = {
+        p["id"]: [
+            c["next_page_id"]
+            for c in p.get("choices") or []
+            if c.get("next_page_id") in known
+        ]
+        for p in pages
+    }
+    layers, depth = _layers(page_ids, start_id, adjacency)
+    layers, parents, signatures = _order(layers, depth, adjacency, previous)
+    return {
+        "positions": _coordinates(layers, parents),
+        "order": {p: i for layer in layers for i, p in enumerate(layer)},
+        "signatures": signatures,
+    }
+
+
+def story_layout(story):
+    """
+    Node coordinates for a story fetched with include_pages, as
+    {page_id: {"x", "y", "level"}}. Computed once per story version; a new
+    version starts from the previous layout and only re-orders the layers a
+    page or choice edit touched, so the rest of the map stays where it was.
+    """
+    key = f"story_layout:{story['id']}"
+    cached = cache.get(key)
+    if cached and cached["version"] == story.get("version"):
+        return cached["positions"]
+
+    layout = compute_layout(
+        story.get("pages") or [],
+        story.get("start_page_id"),
+        cached,
+    )
+    cache.set(key, {"version": story.get("version"), **layout}, None)
+    return layout["positions"]
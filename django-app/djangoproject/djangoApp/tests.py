@@ -1,3 +1,151 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .models import ChoiceStats, EndingStats, PageStats, Play, PlaySession, StoryStats
+from .paths import decode_path, encode_path
+from .stats import rebuild_funnels, rebuild_stats, write_plays
+
+
+class PathEncodingTests(SimpleTestCase):
+    def test_round_trip(self):
+        for path in (
+            [],
+            [1],
+            [5, 6, 7, 8],
+            [100, 3, 250, 4, 4],  # negative and zero deltas
+            [1, 2 ** 40, 1],  # multi-byte varints both ways
+        ):
+            self.assertEqual(decode_path(encode_path(path)), path)
+
+    def test_small_steps_take_one_byte(self):
+        # zigzag keeps -64..63 in one byte: page 1, then +1, -2, +63, -64
+        self.assertEqual(len(encode_path([1, 2, 0, 63, -1])), 5)
+        self.assertEqual(encode_path([64]), bytes([0x80, 0x01]))
+
+    def test_empty_blob(self):
+        self.assertEqual(decode_path(b""), [])
+        self.assertEqual(decode_path(None), [])
+
+
+def play(story_id, user=None, ending_page_id=10, path=None):
+    return {
+        "story_id": story_id,
+        "ending_page_id": ending_page_id,
+        "ending_label": f"Ending {ending_page_id}",
+        "user_id": user.id if user else None,
+        "path": path or [],
+    }
+
+
+class WritePlaysTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+
+    def stats(self, story_id):
+        s = StoryStats.objects.get(story_id=story_id)
+        return s.total_plays, s.unique_players
+
+    def test_counts_each_player_once_per_batch(self):
+        write_plays([
+            play(1, self.alice), play(1, self.alice), play(1, self.bob), play(2, self.alice),
+        ])
+        self.assertEqual(self.stats(1), (3, 2))
+        self.assertEqual(self.stats(2), (1, 1))
+
+    def test_players_seen_in_earlier_batches_are_not_new(self):
+        write_plays([play(1, self.alice)])
+        # bob has played story 2 only, so he is still new to story 1
+        write_plays([play(2, self.bob)])
+        write_plays([play(1, self.alice), play(1, self.bob)])
+        self.assertEqual(self.stats(1), (3, 2))
+        self.assertEqual(self.stats(2), (1, 1))
+
+    def test_anonymous_plays_count_as_plays_not_players(self):
+        write_plays([play(1), play(1), play(1, self.alice)])
+        self.assertEqual(self.stats(1), (3, 1))
+
+    def test_ending_counts_and_paths(self):
+        plays = write_plays([
+            play(1, ending_page_id=10, path=[1, 4, 10]),
+            play(1, ending_page_id=10),
+            play(1, ending_page_id=11),
+        ])
+        self.assertEqual(
+            dict(EndingStats.objects.filter(story_id=1).values_list("ending_page_id", "count")),
+            {10: 2, 11: 1},
+        )
+        self.assertEqual(EndingStats.objects.get(ending_page_id=11).ending_label, "Ending 11")
+        self.assertEqual(decode_path(Play.objects.get(pk=plays[0].pk).path), [1, 4, 10])
+
+    def test_matches_rebuild_stats(self):
+        write_plays([play(1, self.alice), play(1), play(2, self.bob)])
+        write_plays([play(1, self.alice), play(1, self.bob), play(2, self.bob)])
+        incremental = set(StoryStats.objects.values_list("story_id", "total_plays", "unique_players"))
+
+        with mock.patch("djangoApp.stats.flask_api.get_pages_bulk", return_value={}):
+            rebuild_stats()
+        rebuilt = set(StoryStats.objects.values_list("story_id", "total_plays", "unique_players"))
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(rebuilt, {(1, 4, 2), (2, 2, 1)})
+
+
+class RebuildFunnelsTests(TestCase):
+    def session(self, story_id, path, idle_hours):
+        s = PlaySession.objects.create(
+            session_key=f"s{PlaySession.objects.count()}",
+            story_id=story_id,
+            current_page_id=path[-1],
+            path=encode_path(path),
+        )
+        # updated_at is auto_now, so backdate it with an update
+        PlaySession.objects.filter(pk=s.pk).update(
+            updated_at=timezone.now() - timedelta(hours=idle_hours)
+        )
+
+    def setUp(self):
+        write_plays([
+            play(1, ending_page_id=3, path=[1, 2, 3]),
+            play(1, ending_page_id=4, path=[1, 2, 1, 4]),  # revisits page 1
+            play(1, ending_page_id=3),  # recorded without a path
+            play(2, ending_page_id=9, path=[7, 9]),
+        ])
+        self.session(1, [1, 2], idle_hours=48)  # abandoned on page 2
+        self.session(1, [1], idle_hours=1)  # still playing: not counted
+
+    def pages(self, story_id):
+        return {
+            p.page_id: (p.visits, p.exits)
+            for p in PageStats.objects.filter(story_id=story_id)
+        }
+
+    def choices(self, story_id):
+        return {
+            (c.page_id, c.next_page_id): c.count
+            for c in ChoiceStats.objects.filter(story_id=story_id)
+        }
+
+    def test_visits_exits_and_choices(self):
+        self.assertEqual(rebuild_funnels(), 2)
+        # a page counts once per playthrough, however often it was revisited
+        self.assertEqual(self.pages(1), {1: (3, 0), 2: (3, 1), 3: (1, 0), 4: (1, 0)})
+        self.assertEqual(
+            self.choices(1), {(1, 2): 3, (2, 3): 1, (2, 1): 1, (1, 4): 1}
+        )
+        self.assertEqual(self.pages(2), {7: (1, 0), 9: (1, 0)})
+
+    def test_only_the_given_stories(self):
+        rebuild_funnels()
+        PageStats.objects.filter(story_id=2).update(visits=100)
+        self.assertEqual(rebuild_funnels([1]), 1)
+        self.assertEqual(self.pages(2), {7: (100, 0), 9: (100, 0)})
+
+    def test_rebuild_replaces_previous_rows(self):
+        rebuild_funnels()
+        rebuild_funnels()
+        self.assertEqual(self.pages(1)[1], (3, 0))
+        self.assertEqual(ChoiceStats.objects.filter(story_id=1).count(), 4)
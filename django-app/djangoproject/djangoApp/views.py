@@ -1,9 +1,16 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from .flask_api import flask_api
-from .models import Play, PlaySession, UserProfile, Rating, Report
+from .flask_api_async import async_flask_api
+from .models import UserProfile, Rating, Report, StoryStats, EndingStats
+from .play_recorder import record_play
+from .progress import current_page, save_progress, clear_progress
+from .stats import ending_stats_for, funnel_for
 from django.contrib.auth.models import User
-from django.db.models import Count, Avg
+from django.db.models import Count, Avg, Sum
 
 #user = User.objects.get(username="keeps")  # replace with your username
 #user.is_staff = True
@@ -11,9 +18,15 @@ from django.db.models import Count, Avg
 #user.save()
 #print("Done! You are now staff.")
 
+STORIES_PER_PAGE = 20
+STATS_PER_PAGE = 50
+
+
 def convert_tags_to_list(story):
-    """Helper function to convert tags string to list"""
-    if story and story.get("tags"):
+    """Helper function to expose the story's tags as a list"""
+    if story and story.get("tag_list") is not None:
+        story["tags_list"] = story["tag_list"]
+    elif story and story.get("tags"):
         story["tags_list"] = [t.strip() for t in story["tags"].split(",") if t.strip()]
     else:
         story["tags_list"] = []
@@ -25,20 +38,33 @@ def home(request):
     # get filter
     search_query = request.GET.get("search", "")
     tags_filter = request.GET.get("tags", "")
+    match_all_tags = request.GET.get("tag_mode") == "all"
+    after_id = request.GET.get("after")
 
-    # fetches
-    stories = flask_api.get_stories(
+    # fetches one page at a time (keyset pagination, the cursor comes from Flask)
+    listing = flask_api.get_stories_page(
         status="published",
         search=search_query if search_query else None,
         tags=tags_filter if tags_filter else None,
+        tag_mode="all" if match_all_tags else None,
+        limit=STORIES_PER_PAGE,
+        after_id=after_id or None,
     )
+    stories = listing["stories"]
     if stories:
+        # one grouped query for every listed story
+        rating_stats = {
+            r["story_id"]: r
+            for r in Rating.objects.filter(story_id__in=[s["id"] for s in stories])
+            .values("story_id")
+            .annotate(avg_rating=Avg("rating"), rating_count=Count("id"))
+        }
         for story in stories:
             convert_tags_to_list(story)
-            ratings = Rating.objects.filter(story_id=story["id"])
-            if ratings.exists():
-                story["avg_rating"] = ratings.aggregate(Avg("rating"))["rating__avg"]
-                story["rating_count"] = ratings.count()
+            story_ratings = rating_stats.get(story["id"])
+            if story_ratings:
+                story["avg_rating"] = story_ratings["avg_rating"]
+                story["rating_count"] = story_ratings["rating_count"]
             else:
                 story["avg_rating"] = None
                 story["rating_count"] = 0
@@ -47,12 +73,27 @@ def home(request):
         "stories": stories,
         "search_query": search_query,
         "tags_filter": tags_filter,
+        "match_all_tags": match_all_tags,
+        "popular_tags": flask_api.get_tags(status="published")[:15],
+        "total_stories": listing["total"],
+        "next_after_id": listing["next_after_id"],
+        "is_first_page": not after_id,
     }
     return render(request, "game/home.html", context)
 
 
-def story_detail(request, story_id):
-    story = flask_api.get_story(story_id)
+async def story_detail(request, story_id):
+    # the Flask fetch and the stats lookup are independent, run them together
+    story, story_stats = await asyncio.gather(
+        async_flask_api.get_story(story_id),
+        StoryStats.objects.filter(story_id=story_id).afirst(),
+    )
+    return await sync_to_async(_render_story_detail)(
+        request, story_id, story, story_stats
+    )
+
+
+def _render_story_detail(request, story_id, story, story_stats):
     if not story:
         messages.error(request, "Story not found")
         return redirect("home")
@@ -72,25 +113,11 @@ def story_detail(request, story_id):
             messages.error(request, "You do not have permission to view this story")
             return redirect("home")
 
-    # stats:
-    plays = Play.objects.filter(story_id=story_id)
-    total_plays = plays.count()
+    # stats (precomputed rollups, see stats.write_plays)
+    total_plays = story_stats.total_plays if story_stats else 0
 
     # ending distribution
-    ending_count = plays.values("ending_page_id").annotate(count=Count("id"))
-    ending_stats = []
-    for ending in ending_count:
-        percentage = (ending["count"] / total_plays * 100) if total_plays > 0 else 0
-        ending_page = flask_api.get_page(ending["ending_page_id"])
-        ending_label = ending_page.get("ending_label") if ending_page else None
-        ending_stats.append(
-            {
-                "ending_page_id": ending["ending_page_id"],
-                "ending_label": ending_label,
-                "count": ending["count"],
-                "percentage": round(percentage, 1),
-            }
-        )
+    ending_stats = ending_stats_for(story_id, total_plays)
 
     ratings = Rating.objects.filter(story_id=story_id).select_related("user")
     avg_rating = ratings.aggregate(Avg("rating"))["rating__avg"]
@@ -105,6 +132,9 @@ def story_detail(request, story_id):
             "author_id"
         ) == request.user.id
 
+    # where readers drop off (PageStats rollup, see stats.rebuild_funnels)
+    funnel = funnel_for(story_id) if can_edit else None
+
     can_moderate = request.user.is_staff if request.user.is_authenticated else False
     reports = None
     if can_moderate:
@@ -119,6 +149,7 @@ def story_detail(request, story_id):
         "rating_count": ratings.count(),
         "user_rating": user_rating,
         "can_edit": can_edit,
+        "funnel": funnel,
         "can_moderate": can_moderate,
         "reports": reports,
     }
@@ -129,7 +160,9 @@ def story_detail(request, story_id):
 
 
 def play_story(request, story_id):
-    story = flask_api.get_story(story_id)
+    # prefetch the whole story graph once; play_page then serves from memory
+    graph = flask_api.get_story_graph(story_id)
+    story = graph["story"] if graph else None
     if not story:
         messages.error(request, "Story not found")
         return redirect("home")
@@ -148,70 +181,53 @@ def play_story(request, story_id):
         request.session.create()
         session_key = request.session.session_key
 
-    saved_session = PlaySession.objects.filter(
-        session_key=session_key, story_id=story_id
-    ).first()
+    saved_page_id = current_page(session_key, story_id)
 
-    if saved_session and request.GET.get("resume") != "false":
-        return redirect(
-            "play_page", story_id=story_id, page_id=saved_session.current_page_id
-        )
+    if saved_page_id and request.GET.get("resume") != "false":
+        return redirect("play_page", story_id=story_id, page_id=saved_page_id)
 
-    start_page = flask_api.get_story_start(story_id)
-    start_page_id = start_page.get("page_id") if start_page else None
+    start_page_id = story.get("start_page_id")
     if not start_page_id:
         messages.error(request, "Story has no start page set yet.")
         return redirect("story_detail", story_id=story_id)
 
-    if saved_session:
-        saved_session.current_page_id = start_page_id
-        saved_session.save()
-    else:
-        PlaySession.objects.create(
-            session_key=session_key,
-            story_id=story_id,
-            current_page_id=start_page_id,
-            user=request.user if request.user.is_authenticated else None,
-        )
+    save_progress(
+        session_key,
+        story_id,
+        start_page_id,
+        user=request.user if request.user.is_authenticated else None,
+        restart=True,
+    )
     redirect_url = f"/play/{story_id}/page/{start_page_id}/"
     if is_preview:
         redirect_url += "?preview=1"
     return redirect(redirect_url)
 
 def play_page(request, story_id, page_id):
-    story = flask_api.get_story(story_id)
-    page = flask_api.get_page(page_id)
+    graph = flask_api.get_story_graph(story_id)
+    story = graph["story"] if graph else None
+    page = graph["pages"].get(page_id) if graph else None
 
     if not story or not page:
         messages.error(request, "Page not found")
         return redirect("home")
     is_preview = request.GET.get("preview") == "1"
     session_key = request.session.session_key
-    if session_key:
-        PlaySession.objects.update_or_create(
-            session_key=session_key,
-            story_id=story_id,
-            defaults={
-                "current_page_id": page_id,
-                "user": request.user if request.user.is_authenticated else None,
-            },
-        )
     if page.get("is_ending"):
+        path = clear_progress(session_key, story_id, page_id)
         if not is_preview:
-            play = Play.objects.create(
+            play = record_play(
                 story_id=story_id,
                 ending_page_id=page_id,
                 user=request.user if request.user.is_authenticated else None,
+                ending_label=page.get("ending_label"),
+                path=path,
             )
-            play_id = play.id
+            # buffered: no id until the batch is written (pass wait=True to get one)
+            play_id = play.id if play else None
         else:
             play_id = None 
 
-        if session_key:
-            PlaySession.objects.filter(
-                session_key=session_key, story_id=story_id
-            ).delete()
-
         context = {
             "story": story,
             "page": page,
@@ -221,6 +237,13 @@ def play_page(request, story_id, page_id):
         }
         return render(request, "game/play_ending.html", context)
 
+    # write-behind: coalesced into PlaySession by progress.flush()
+    save_progress(
+        session_key,
+        story_id,
+        page_id,
+        user=request.user if request.user.is_authenticated else None,
+    )
     context = {
         "story": story,
         "page": page,
@@ -235,28 +258,43 @@ def stats(request):
         messages.error(request, "You do not have permission to view statistics")
         return redirect("home")
 
-    stories = flask_api.get_stories(status="published")
+    after_id = request.GET.get("after")
+    listing = flask_api.get_stories_page(
+        status="published",
+        limit=STATS_PER_PAGE,
+        after_id=after_id if after_id and after_id.isdigit() else None,
+    )
+    stories = listing["stories"]
+    story_ids = [s["id"] for s in stories]
+    rollups = {
+        s.story_id: s for s in StoryStats.objects.filter(story_id__in=story_ids)
+    }
+    endings = {}
+    for e in EndingStats.objects.filter(story_id__in=story_ids).values(
+        "story_id", "ending_page_id", "count"
+    ):
+        endings.setdefault(e["story_id"], []).append(
+            {"ending_page_id": e["ending_page_id"], "count": e["count"]}
+        )
+
     story_stats = []
     for story in stories:
-        plays = Play.objects.filter(story_id=story["id"])
-        total_plays = plays.count()
-        ending_counts = plays.values("ending_page_id").annotate(count=Count("id"))
+        rollup = rollups.get(story["id"])
         story_stats.append(
             {
                 "story": story,
-                "total_plays": total_plays,
-                "unique_players": plays.filter(user__isnull=False)
-                .values("user")
-                .distinct()
-                .count(),
-                "endings": list(ending_counts),
+                "total_plays": rollup.total_plays if rollup else 0,
+                "unique_players": rollup.unique_players if rollup else 0,
+                "endings": endings.get(story["id"], []),
             }
         )
-    total_plays = Play.objects.count()
+    total_plays = StoryStats.objects.aggregate(total=Sum("total_plays"))["total"] or 0
     total_users = User.objects.count()
-    total_stories = len(stories)
+    total_stories = listing["total"]
     context = {
         "story_stats": story_stats,
+        "next_after_id": listing["next_after_id"],
+        "is_first_page": not after_id,
         "total_plays": total_plays,
         "total_users": total_users,
         "total_stories": total_stories,
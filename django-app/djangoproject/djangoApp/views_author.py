@@ -1,4 +1,5 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.contrib.auth import login as auth_login
 from django.contrib.auth.models import User
@@ -6,19 +7,13 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.http import HttpResponseForbidden
 from .flask_api import flask_api
-from .models import UserProfile, Rating, Report
+from .flask_api_async import async_flask_api
+from .models import UserProfile, Rating, Report, EndingStats
+from .story_layout import story_layout
+from .views import convert_tags_to_list
 import json
 
 
-def convert_tags_to_list(story):
-    """Helper function to convert tags string to list"""
-    if story and story.get("tags"):
-        story["tags_list"] = [t.strip() for t in story["tags"].split(",") if t.strip()]
-    else:
-        story["tags_list"] = []
-    return story
-
-
 def register(request):
     if request.method == "POST":
         username = request.POST.get("username")
@@ -50,26 +45,25 @@ def register(request):
 
 
 @login_required
-def my_stories(request):
-    profile = get_object_or_404(UserProfile, user=request.user)
+async def my_stories(request):
+    user = await request.auser()
+    profile = await aget_object_or_404(UserProfile.objects.select_related("user"), user=user)
 
     if not profile.is_author():
         messages.error(
             request, "You need to be an author to create stories, make an account!"
         )
         return redirect("home")
-    all_stories = flask_api.get_stories()
-    my_stories = [s for s in all_stories if s.get("author_id") == request.user.id]
-    for i, s in enumerate(my_stories):
-        full = flask_api.get_story(s["id"], include_pages=True)
-        if full:
-            my_stories[i] = full
+    # one upstream call: the author's stories with page/ending/choice counts
+    my_stories = await async_flask_api.get_stories(
+        author_id=user.id, include="page_counts"
+    )
     for story in my_stories:
         convert_tags_to_list(story)
     published_count = len([s for s in my_stories if s.get("status") == "published"])
     draft_count = len([s for s in my_stories if s.get("status") == "draft"])
     context = {"stories": my_stories, "published_count": published_count, "draft_count": draft_count,          }
-    return render(request, "game/my_stories.html", context)
+    return await sync_to_async(render)(request, "game/my_stories.html", context)
 
 
 @login_required
@@ -126,6 +120,9 @@ def edit_story(request, story_id):
             status = request.POST.get("status", "draft")
 
             tags_list = [t.strip() for t in tags.split(",") if t.strip()]
+            # readers keep the last published version of a live story until
+            # the author publishes the edits made since
+            republish = {"republish": True} if request.POST.get("republish") else {}
 
             updated_story = flask_api.update_story(
                 story_id,
@@ -133,9 +130,12 @@ def edit_story(request, story_id):
                 description=description,
                 status=status,
                 tags=tags_list,
+                **republish,
             )
             if updated_story:
-                messages.success(request, "Story has been updated")
+                messages.success(
+                    request, "Changes published" if republish else "Story has been updated"
+                )
                 return redirect("edit_story", story_id=story_id)
             else:
                 messages.error(request, "Failed to update")
@@ -225,6 +225,10 @@ def edit_page(request, page_id):
             page_id, text=text, is_ending=is_ending, ending_label=ending_label
         )
         if updated_page:
+            # keep the label cached on the ending rollups in step
+            EndingStats.objects.filter(ending_page_id=page_id).update(
+                ending_label=ending_label or ""
+            )
             messages.success(request, "Page updated successfully")
             return redirect("edit_story", story_id=page["story_id"])
         else:
@@ -251,7 +255,7 @@ def delete_page(request, page_id):
     if not profile.is_admin() and story.get("author_id") != request.user.id:
         return HttpResponseForbidden("You do not have permission to delete this story")
     if request.method == "POST":
-        if flask_api.delete_page(page_id):
+        if flask_api.delete_page(page_id, story_id=story_id):
             messages.success(request, "Page deleted successfully")
         else:
             messages.error(request, "Failed to delete page")
@@ -290,7 +294,10 @@ def create_choice(request, page_id):
                 request, "game/create_choice.html", {"page": page, "story": story}
             )
         choice = flask_api.create_choice(
-            page_id=page_id, text=text, next_page_id=next_page_id
+            page_id=page_id,
+            text=text,
+            next_page_id=next_page_id,
+            story_id=page["story_id"],
         )
         if choice:
             messages.success(request, "Choice created successfully")
@@ -308,7 +315,7 @@ def delete_choice(request, choice_id):
         page_id = request.POST.get("page_id")
         story_id = request.POST.get("story_id")
 
-        if flask_api.delete_choice(choice_id):
+        if flask_api.delete_choice(choice_id, page_id=page_id, story_id=story_id):
             messages.success(request, "choice deleted successfully")
         else:
             messages.error(request, "Failed to delete choice")
@@ -366,6 +373,7 @@ def story_tree(request, story_id):
 
     pages = story.get("pages", []) or []
     start_id = story.get("start_page_id")
+    positions = story_layout(story)
 
     nodes = []
     edges = []
@@ -383,6 +391,7 @@ def story_tree(request, story_id):
                 "is_start": (p.get("id") == start_id),
                 "is_ending": bool(p.get("is_ending")),
                 "ending_label": p.get("ending_label") or "",
+                **positions[p.get("id")],
             }
         )
 
@@ -403,6 +412,7 @@ def story_tree(request, story_id):
         {
             "story": story,
             "tree_data": json.dumps(tree_data),
+            "analysis": flask_api.get_story_analysis(story_id),
         },
     )
 
@@ -490,9 +500,10 @@ def reports_list(request):
         return redirect("home")
 
     reports = Report.objects.all().order_by("status", "-id")
+    stories = flask_api.get_stories_bulk(r.story_id for r in reports)
     enriched_reports = []
     for r in reports:
-        story = flask_api.get_story(r.story_id)
+        story = stories.get(r.story_id)
         r.story_title = story["title"] if story else "Unknown Story"
         enriched_reports.append(r)
 
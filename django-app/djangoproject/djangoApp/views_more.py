@@ -1,25 +1,38 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from .models import Play, Rating
-from .flask_api import flask_api
+from .models import Play, Rating, StoryStats
+from .flask_api_async import async_flask_api
+from .stats import ending_stats_for, funnel_for
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Avg
+from django.db.models import Avg
 from django.http import JsonResponse
 
 @login_required
-def my_history(request):
+async def my_history(request):
 
-    plays = Play.objects.filter(user=request.user).order_by('-created_at')
+    user = await request.auser()
+    plays = [
+        play async for play in Play.objects.filter(user=user).order_by('-created_at')
+    ]
     
     play_data = []
     unique_stories = set()
     unique_endings = set()
 
+    # one bulk call each for stories and ending pages, fetched concurrently
+    stories, ending_pages = await asyncio.gather(
+        async_flask_api.get_stories_bulk(p.story_id for p in plays),
+        async_flask_api.get_pages_bulk(p.ending_page_id for p in plays),
+    )
+
     for play in plays:
-        story = flask_api.get_story(play.story_id)
+        story = stories.get(play.story_id)
         if story:
             unique_stories.add(play.story_id)
             # Get ending page info
-            ending_page = flask_api.get_page(play.ending_page_id)
+            ending_page = ending_pages.get(play.ending_page_id)
             if ending_page and ending_page.get('ending_label'):
                 unique_endings.add(ending_page.get('ending_label'))
             
@@ -36,30 +49,17 @@ def my_history(request):
         'unique_endings_count': len(unique_endings),
     }
     
-    return render(request, 'game/my_history.html', context)
+    return await sync_to_async(render)(request, 'game/my_history.html', context)
 
 def api_story_stats(request, story_id):
 
-    plays = Play.objects.filter(story_id=story_id)
-    total_plays = plays.count()
-    
-    # Ending distribution
-    ending_counts = plays.values('ending_page_id').annotate(count=Count('id'))
-    ending_stats = []
+    story_stats = StoryStats.objects.filter(story_id=story_id).first()
+    total_plays = story_stats.total_plays if story_stats else 0
     
-    for ending in ending_counts:
-        percentage = (ending['count'] / total_plays * 100) if total_plays > 0 else 0
-        
-        # Get ending label from Flask
-        ending_page = flask_api.get_page(ending['ending_page_id'])
-        ending_label = ending_page.get('ending_label', 'Unknown') if ending_page else 'Unknown'
-        
-        ending_stats.append({
-            'ending_page_id': ending['ending_page_id'],
-            'ending_label': ending_label,
-            'count': ending['count'],
-            'percentage': round(percentage, 1)
-        })
+    # Ending distribution (labels are cached on the rollup rows)
+    ending_stats = ending_stats_for(story_id, total_plays)
+    for ending in ending_stats:
+        ending['ending_label'] = ending['ending_label'] or 'Unknown'
     ratings = Rating.objects.filter(story_id=story_id)
     avg_rating = ratings.aggregate(Avg('rating'))['rating__avg']
 
@@ -68,5 +68,6 @@ def api_story_stats(request, story_id):
         'total_plays': total_plays,
         'ending_stats': ending_stats,
         'avg_rating': round(avg_rating, 2) if avg_rating else None,
-        'rating_count': ratings.count()
+        'rating_count': ratings.count(),
+        'funnel': funnel_for(story_id),
     })
\ No newline at end of file
@@ -20,6 +20,52 @@ load_dotenv(os.path.join(BASE_DIR.parent / '.env'))
 # Now you can access them
 FLASK_API_URL = os.getenv("FLASK_API_URL", 'http://localhost:5000')
 FLASK_API_KEY = os.getenv("FLASK_API_KEY")
+
+# Flask API client transport (keep-alive pool per worker thread)
+FLASK_API_POOL_SIZE = int(os.getenv("FLASK_API_POOL_SIZE", 10))
+FLASK_API_CONNECT_TIMEOUT = float(os.getenv("FLASK_API_CONNECT_TIMEOUT", 3))
+FLASK_API_TIMEOUT = float(os.getenv("FLASK_API_TIMEOUT", 10))
+FLASK_API_RETRIES = int(os.getenv("FLASK_API_RETRIES", 2))  # GET/HEAD only
+FLASK_API_RETRY_BACKOFF = float(os.getenv("FLASK_API_RETRY_BACKOFF", 0.2))
+# ids per bulk ?ids= request: 200 ids stay well under the 4094-byte request
+# line gunicorn accepts; bigger lookups are split into several calls
+FLASK_API_BULK_CHUNK_SIZE = int(os.getenv("FLASK_API_BULK_CHUNK_SIZE", 200))
+# async client (flask_api_async): max in-flight requests per event loop
+FLASK_API_ASYNC_CONCURRENCY = int(os.getenv("FLASK_API_ASYNC_CONCURRENCY", 10))
+
+# Story content cache (see FlaskAPIClient); writes evict the affected keys.
+# Entries are served as-is for CACHE_TTL seconds, then revalidated with their
+# ETag for as long as CACHE_STALE_TTL.
+FLASK_API_CACHE_ALIAS = os.getenv("FLASK_API_CACHE_ALIAS", "default")
+FLASK_API_CACHE_TTL = int(os.getenv("FLASK_API_CACHE_TTL", 30))
+FLASK_API_CACHE_STALE_TTL = int(os.getenv("FLASK_API_CACHE_STALE_TTL", 3600))
+
+# Whole-story graphs held in process memory for gameplay (play_story/play_page)
+FLASK_API_GRAPH_CACHE_SIZE = int(os.getenv("FLASK_API_GRAPH_CACHE_SIZE", 100))
+FLASK_API_GRAPH_CHECK_INTERVAL = float(os.getenv("FLASK_API_GRAPH_CHECK_INTERVAL", 5))
+
+# Reader progress (see djangoApp/progress.py): page clicks go to the cache and
+# are persisted to PlaySession in coalesced batches every FLUSH_INTERVAL
+# seconds. Set PLAY_PROGRESS_WRITE_BEHIND=False to write every click through.
+PLAY_PROGRESS_WRITE_BEHIND = os.getenv("PLAY_PROGRESS_WRITE_BEHIND", "True") == "True"
+PLAY_PROGRESS_FLUSH_INTERVAL = float(os.getenv("PLAY_PROGRESS_FLUSH_INTERVAL", 5))
+PLAY_PROGRESS_FLUSH_BATCH = int(os.getenv("PLAY_PROGRESS_FLUSH_BATCH", 500))
+# longest page path kept per playthrough (older steps are dropped)
+PLAY_PATH_MAX_LENGTH = int(os.getenv("PLAY_PATH_MAX_LENGTH", 1000))
+# `manage.py rebuild_funnels` counts sessions idle this many hours as abandoned
+FUNNEL_ABANDON_AFTER = int(os.getenv("FUNNEL_ABANDON_AFTER", 24))
+
+# Finished plays (see djangoApp/play_recorder.py) are queued and written in
+# batches every PLAY_RECORDER_FLUSH_MS or PLAY_RECORDER_BATCH_SIZE plays,
+# spooled to PLAY_RECORDER_SPOOL_DIR until committed. The default is runtime
+# state outside the source tree (django-app/var; a named volume in Docker).
+PLAY_RECORDER_BUFFERED = os.getenv("PLAY_RECORDER_BUFFERED", "True") == "True"
+PLAY_RECORDER_BATCH_SIZE = int(os.getenv("PLAY_RECORDER_BATCH_SIZE", 200))
+PLAY_RECORDER_FLUSH_MS = int(os.getenv("PLAY_RECORDER_FLUSH_MS", 250))
+PLAY_RECORDER_SPOOL_DIR = os.getenv(
+    "PLAY_RECORDER_SPOOL_DIR", BASE_DIR.parent / "var" / "spool"
+)
+PLAY_RECORDER_FSYNC = os.getenv("PLAY_RECORDER_FSYNC", "False") == "True"
 DB_NAME = os.getenv("DB_NAME")
 
 # Quick-start development settings - unsuitable for production
@@ -83,14 +129,72 @@ WSGI_APPLICATION = 'djangoproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# WAL lets readers run while a write is in progress; IMMEDIATE transactions
+# take the write lock up front instead of failing on a read->write upgrade,
+# and the busy timeout makes writers queue for it. synchronous=NORMAL is safe
+# with WAL (a power cut can only lose the last commits, never corrupt).
+# SQLITE_TUNED=False keeps stock SQLite.
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "True") == "True"
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+    # small per-connection cache: reads are served from the shared mmap
+    f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_SIZE_KB', 2 * 1024))}",
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / DB_NAME,
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 30000)) / 1000,
+        } if SQLITE_TUNED else {},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# locmem is per process; with several worker processes (gunicorn) set
+# DJANGO_CACHE_DIR, or DJANGO_REDIS_URL, so they share one cache, and with it
+# the API cache invalidations and unflushed reading progress
+DJANGO_CACHE_DIR = os.getenv("DJANGO_CACHE_DIR")
+DJANGO_REDIS_URL = os.getenv("DJANGO_REDIS_URL")
+# Django's default of 300 would cull reading progress, snapshots and layouts;
+# the file cache lists its directory on every set, so keep this within reason
+# and move to Redis for more
+DJANGO_CACHE_MAX_ENTRIES = int(os.getenv("DJANGO_CACHE_MAX_ENTRIES", 20000))
+
+if DJANGO_REDIS_URL:
+    # needs the redis package (pip install redis)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': DJANGO_REDIS_URL,
+        }
+    }
+elif DJANGO_CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': DJANGO_CACHE_DIR,
+            'OPTIONS': {'MAX_ENTRIES': DJANGO_CACHE_MAX_ENTRIES},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'enchantext',
+            'OPTIONS': {'MAX_ENTRIES': DJANGO_CACHE_MAX_ENTRIES},
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -0,0 +1,48 @@
+"""
+Gunicorn settings for the Django app (gunicorn reads ./gunicorn.conf.py):
+
+    gunicorn djangoproject.asgi
+
+Workers serve the ASGI application with uvicorn, so the async views
+(story_detail, my_history, my_stories) run on one event loop per worker and
+share its pooled httpx client; sync views run in the worker's thread
+executor. The project is imported once in the master (preload_app) and forked into
+the workers, which share its memory copy-on-write. Django opens database
+connections per thread on first use, so workers never reuse the master's;
+the play progress and play recorder queues reset themselves in each worker.
+kill -HUP <master> restarts the workers gracefully; with preload_app the
+code is not re-imported, so deploy new code with USR2 (new master) + QUIT
+(old master), or a container restart.
+"""
+import gc
+import os
+
+
+def _cores():
+    try:
+        return len(os.sched_getaffinity(0))  # respects container CPU sets
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * _cores() + 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# recycle workers now and then to cap slow leaks; jitter staggers restarts
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# heartbeat files on tmpfs: a slow container disk cannot stall the workers
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = "-"
+
+
+def pre_fork(server, worker):
+    # move the preloaded app's objects out of the collector's reach, so
+    # collections in the workers do not touch (and copy) the shared pages
+    gc.freeze()
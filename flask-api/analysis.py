@@ -0,0 +1,191 @@
+import threading
+from collections import OrderedDict, deque
+
+from extensions import db
+from models import Page, Choice
+
+# Structural report for a story graph, built from Page/Choice rows. Every pass
+# is linear in pages + choices. Reports are cached per (story id, version),
+# so any write to the story makes the next request recompute it.
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _load_graph(story_id):
+    pages = (
+        db.session.query(Page.id, Page.is_ending)
+        .filter(Page.story_id == story_id)
+        .order_by(Page.id.asc())
+        .all()
+    )
+    choices = (
+        db.session.query(Choice.id, Choice.page_id, Choice.next_page_id)
+        .join(Page, Choice.page_id == Page.id)
+        .filter(Page.story_id == story_id)
+        .order_by(Choice.id.asc())
+        .all()
+    )
+    return pages, choices
+
+
+def _bfs(adjacency, sources):
+    """Distance (in choices) from the nearest source; -1 where unreachable."""
+    dist = [-1] * len(adjacency)
+    queue = deque()
+    for s in sources:
+        if dist[s] < 0:
+            dist[s] = 0
+            queue.append(s)
+    while queue:
+        u = queue.popleft()
+        for v in adjacency[u]:
+            if dist[v] < 0:
+                dist[v] = dist[u] + 1
+                queue.append(v)
+    return dist
+
+
+def _strongly_connected(adjacency):
+    """Tarjan's algorithm without recursion; returns a component index per node."""
+    n = len(adjacency)
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    component = [-1] * n
+    stack = []
+    counter = 0
+    components = 0
+
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        work = [(root, 0)]
+        while work:
+            u, i = work.pop()
+            if i == 0:
+                index[u] = low[u] = counter
+                counter += 1
+                stack.append(u)
+                on_stack[u] = True
+            edges = adjacency[u]
+            while i < len(edges):
+                v = edges[i]
+                i += 1
+                if index[v] < 0:
+                    work.append((u, i))
+                    work.append((v, 0))
+                    break
+                if on_stack[v]:
+                    low[u] = min(low[u], index[v])
+            else:
+                if low[u] == index[u]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component[w] = components
+                        if w == u:
+                            break
+                    components += 1
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[u])
+    return component
+
+
+def build_report(story_id, start_page_id, pages, choices):
+    ids = [p.id for p in pages]
+    position = {page_id: i for i, page_id in enumerate(ids)}
+    is_ending = [bool(p.is_ending) for p in pages]
+    adjacency = [[] for _ in ids]
+    reverse = [[] for _ in ids]
+    broken_choices = []
+    for choice_id, page_id, next_page_id in choices:
+        target = position.get(next_page_id)
+        if target is None:
+            broken_choices.append(choice_id)
+            continue
+        adjacency[position[page_id]].append(target)
+        reverse[target].append(position[page_id])
+
+    start = position.get(start_page_id)
+    depth = _bfs(adjacency, [] if start is None else [start])
+    endings = [i for i, ending in enumerate(is_ending) if ending]
+    # pages from which some ending can still be reached
+    to_ending = _bfs(reverse, endings)
+
+    component = _strongly_connected(adjacency)
+    members = {}
+    for i, c in enumerate(component):
+        members.setdefault(c, []).append(i)
+    loops = []
+    for c, nodes in members.items():
+        if len(nodes) == 1 and nodes[0] not in adjacency[nodes[0]]:
+            continue
+        if depth[nodes[0]] < 0:
+            continue  # only loops a reader can actually get into
+        has_exit = any(component[v] != c for u in nodes for v in adjacency[u])
+        has_ending = any(is_ending[u] for u in nodes)
+        loops.append(
+            {
+                "pages": sorted(ids[u] for u in nodes),
+                "has_exit": has_exit,
+                "trap": not has_exit and not has_ending,
+            }
+        )
+    loops.sort(key=lambda loop: loop["pages"][0])
+
+    ending_depths = [depth[i] for i in endings if depth[i] >= 0]
+    reachable = [i for i, d in enumerate(depth) if d >= 0]
+
+    return {
+        "story_id": story_id,
+        "start_page_id": start_page_id,
+        "page_count": len(ids),
+        "choice_count": len(choices),
+        "reachable_count": len(reachable),
+        "unreachable_pages": [ids[i] for i, d in enumerate(depth) if d < 0],
+        "dead_ends": [
+            ids[i] for i in range(len(ids)) if not is_ending[i] and not adjacency[i]
+        ],
+        "no_way_to_ending": [ids[i] for i in reachable if to_ending[i] < 0],
+        "broken_choices": broken_choices,
+        "loops": loops,
+        "endings": {
+            "total": len(endings),
+            "reachable": len(ending_depths),
+            "unreachable": [ids[i] for i in endings if depth[i] < 0],
+        },
+        "paths": {
+            "max_depth": max((depth[i] for i in reachable), default=None),
+            "shortest_to_ending": min(ending_depths, default=None),
+            "longest_shortest_to_ending": max(ending_depths, default=None),
+            "mean_to_ending": (
+                round(sum(ending_depths) / len(ending_depths), 2)
+                if ending_depths
+                else None
+            ),
+        },
+    }
+
+
+def analyze_story(story):
+    """The report for the story's current version, computed at most once per version."""
+    key = (story.id, story.version)
+    with _cache_lock:
+        report = _cache.get(key)
+        if report is not None:
+            _cache.move_to_end(key)
+            return report
+
+    pages, choices = _load_graph(story.id)
+    report = build_report(story.id, story.start_page_id, pages, choices)
+    report["version"] = story.version
+
+    with _cache_lock:
+        _cache[key] = report
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return report
@@ -1,8 +1,42 @@
-from flask import Flask, request, jsonify
-from sqlalchemy import or_
+import gzip
+import io
+
+from flask import Flask, request, jsonify, redirect, url_for, stream_with_context
+from sqlalchemy import case, func, inspect, text
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import ObjectDeletedError
 from config import Config
-from extensions import db
+from extensions import db, dispose_after_fork, init_sqlite
 from models import Story, Page, Choice
+import analysis as story_analysis
+import batch as story_batch
+import search as story_search
+import snapshots as story_snapshots
+import tags as story_tags
+import transfer as story_transfer
+import versions as story_versions
+
+
+def upgrade_schema():
+    """
+    create_all() only creates missing tables, so bring existing databases up
+    to date with columns and indexes added to the models later on.
+    """
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+            ddl += column.type.compile(dialect=db.engine.dialect)
+            if column.server_default is not None:
+                ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+            with db.engine.begin() as conn:
+                conn.execute(text(ddl))
+
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
 
 
 def create_app():
@@ -11,13 +45,66 @@ def create_app():
     db.init_app(app)
 
     with app.app_context():
+        init_sqlite(app)
         db.create_all()
+        upgrade_schema()
+        story_versions.init_versions()
+        story_search.init_search()
+        story_tags.backfill_tags()
+        story_snapshots.backfill_snapshots()
+        dispose_after_fork()
+
+    @app.cli.command("rebuild-search")
+    def rebuild_search():
+        """Rebuild the full-text story search index from scratch."""
+        count = story_search.rebuild_search_index()
+        db.session.commit()
+        print(f"Indexed {count} stories")
 
     # Helpers
     def error(message, code=400):
         return jsonify({"error": message}), code
 
-    VALID_STATUSES = {"draft", "published", "suspended"}
+    def not_modified(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    @app.after_request
+    def conditional_get(response):
+        # endpoints without a cheap version-based ETag get a hash of the body
+        if (
+            request.method == "GET"
+            and response.status_code == 200
+            and response.mimetype == "application/json"
+        ):
+            if "ETag" not in response.headers:
+                response.add_etag()
+            response.make_conditional(request)
+        return response
+
+    def bump_version(story_id):
+        """Every write to a story, its pages or its choices invalidates its ETags"""
+        Story.query.filter_by(id=story_id).update(
+            {Story.version: story_versions.next_version(db.session)},
+            synchronize_session=False,
+        )
+
+    def serialize_story(s):
+        return {
+            "id": s.id,
+            "title": s.title,
+            "description": s.description,
+            "status": s.status,
+            "start_page_id": s.start_page_id,
+            "author_id": s.author_id,
+            "tags": s.tags,
+            "tag_list": [t.name for t in s.tag_items],
+            "version": s.version,
+            "compiled_version": s.compiled_version,
+        }
+
+    MAX_PAGE_SIZE = 500
 
     def require_api_key():
         expected = app.config.get("API_KEY", "")
@@ -30,17 +117,20 @@ def create_app():
 
         return None
 
-    def normalize_tags(tags_value):
+    def parse_ids(raw):
         """
-        Store tags as a single comma-separated string in DB.
-        Django may send tags as a list or string.
+        Parse a comma-separated ?ids= value into a de-duplicated list of ints.
+        Returns None if any entry is not an integer.
         """
-        if tags_value is None:
-            return None
-        if isinstance(tags_value, list):
-            cleaned = [str(t).strip() for t in tags_value if str(t).strip()]
-            return ",".join(cleaned) if cleaned else ""
-        return str(tags_value)
+        ids = []
+        for part in str(raw).split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                return None
+            ids.append(int(part))
+        return list(dict.fromkeys(ids))
 
     # READ ENDPOINTS 
 
@@ -49,35 +139,123 @@ def create_app():
         status = request.args.get("status")
         search = request.args.get("search")
         tags = request.args.get("tags") 
+        ids = request.args.get("ids")
+        author_id = request.args.get("author_id")
+        include = {i.strip() for i in request.args.get("include", "").split(",")}
+        limit = request.args.get("limit")
+        after_id = request.args.get("after_id")
 
         q = Story.query
 
+        if author_id is not None:
+            if not author_id.isdigit():
+                return error("author_id must be an integer", 400)
+            q = q.filter_by(author_id=int(author_id))
+
+        if ids is not None:
+            id_list = parse_ids(ids)
+            if id_list is None:
+                return error("ids must be a comma-separated list of integers", 400)
+            q = q.filter(Story.id.in_(id_list))
+
         if status:
             q = q.filter_by(status=status)
 
+        ranked = None
         if search:
-            like = f"%{search.strip()}%"
-            q = q.filter(Story.title.ilike(like))
+            match = story_search.to_match_query(search)
+            if story_search.fts_enabled() and match:
+                ranked = story_search.ranked_matches(match)
+                q = q.join(ranked, ranked.c.story_id == Story.id)
+            else:
+                like = f"%{search.strip()}%"
+                q = q.filter(Story.title.ilike(like))
 
         if tags:
-            tag_list = [t.strip() for t in str(tags).split(",") if t.strip()]
-            if tag_list:
-                conditions = [Story.tags.ilike(f"%{t}%") for t in tag_list]
-                q = q.filter(or_(*conditions))
-
-        stories = q.order_by(Story.id.desc()).all()
-
-        return jsonify([
-            {
-                "id": s.id,
-                "title": s.title,
-                "description": s.description,
-                "status": s.status,
-                "start_page_id": s.start_page_id,
-                "author_id": s.author_id,
-                "tags": s.tags,
+            q = story_tags.filter_by_tags(
+                q,
+                story_tags.split_tags(tags),
+                match_all=request.args.get("tag_mode") == "all",
+            )
+
+        # keyset pagination: newest first, ?after_id= is the last id already
+        # seen. Ranked search results go best match first, keyed on
+        # (rank, id), and their cursor is "<rank>:<id>" of the last result.
+        total = None
+        if limit is not None:
+            if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+                return error(f"limit must be between 1 and {MAX_PAGE_SIZE}", 400)
+            limit = int(limit)
+            total = q.count()
+
+        if after_id is not None and ranked is not None:
+            try:
+                after_rank, after_story = after_id.split(":")
+                after_rank, after_story = float(after_rank), int(after_story)
+            except ValueError:
+                return error("after_id must be a cursor from X-Next-After-Id", 400)
+            q = q.filter(
+                (ranked.c.rank > after_rank)
+                | ((ranked.c.rank == after_rank) & (Story.id < after_story))
+            )
+        elif after_id is not None:
+            if not after_id.isdigit():
+                return error("after_id must be an integer", 400)
+            q = q.filter(Story.id < int(after_id))
+
+        if ranked is not None:
+            q = q.add_columns(ranked.c.rank).order_by(ranked.c.rank, Story.id.desc())
+        else:
+            q = q.order_by(Story.id.desc())
+        if limit is not None:
+            q = q.limit(limit)
+        rows = q.options(selectinload(Story.tag_items)).all()
+        stories = [row[0] for row in rows] if ranked is not None else rows
+
+        payload = [serialize_story(s) for s in stories]
+
+        if "page_counts" in include and stories:
+            # per-story aggregates instead of the full page text
+            story_ids = [s.id for s in stories]
+            page_counts = {
+                row[0]: row[1:]
+                for row in db.session.query(
+                    Page.story_id,
+                    func.count(Page.id),
+                    func.sum(case((Page.is_ending.is_(True), 1), else_=0)),
+                )
+                .filter(Page.story_id.in_(story_ids))
+                .group_by(Page.story_id)
             }
-            for s in stories
+            choice_counts = dict(
+                db.session.query(Page.story_id, func.count(Choice.id))
+                .join(Choice, Choice.page_id == Page.id)
+                .filter(Page.story_id.in_(story_ids))
+                .group_by(Page.story_id)
+                .all()
+            )
+            for item in payload:
+                pages, endings = page_counts.get(item["id"], (0, 0))
+                item["page_count"] = pages
+                item["ending_count"] = endings or 0
+                item["choice_count"] = choice_counts.get(item["id"], 0)
+
+        response = jsonify(payload)
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total)
+            if len(stories) == limit and ranked is not None:
+                last_rank = rows[-1][1]
+                response.headers["X-Next-After-Id"] = f"{last_rank!r}:{stories[-1].id}"
+            elif len(stories) == limit:
+                response.headers["X-Next-After-Id"] = str(stories[-1].id)
+        return response
+
+    @app.get("/tags")
+    def list_tags():
+        status = request.args.get("status")
+        return jsonify([
+            {"name": name, "count": count}
+            for name, count in story_tags.tag_counts(status)
         ])
 
     @app.get("/stories/<int:story_id>")
@@ -88,22 +266,29 @@ def create_app():
 
         include_pages = request.args.get("include_pages", "").lower() in {"1", "true", "yes"}
 
-        payload = {
-            "id": s.id,
-            "title": s.title,
-            "description": s.description,
-            "status": s.status,
-            "start_page_id": s.start_page_id,
-            "author_id": s.author_id,
-            "tags": s.tags,
-        }
+        etag = f"story-{s.id}-v{s.version}" + ("-pages" if include_pages else "")
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        payload = serialize_story(s)
 
         if include_pages:
+            # two queries for the whole graph, regardless of story size
             pages = Page.query.filter_by(story_id=s.id).order_by(Page.id.asc()).all()
+            story_choices = (
+                Choice.query.join(Page, Choice.page_id == Page.id)
+                .filter(Page.story_id == s.id)
+                .order_by(Choice.id.asc())
+                .all()
+            )
+            choices_by_page = {}
+            for c in story_choices:
+                choices_by_page.setdefault(c.page_id, []).append(c)
+
             payload["pages"] = []
     
             for page_num, p in enumerate(pages, start=1):
-                choices = Choice.query.filter_by(page_id=p.id).order_by(Choice.id.asc()).all()
+                choices = choices_by_page.get(p.id, [])
                 
                 payload["pages"].append({
                     "id": p.id,
@@ -122,7 +307,9 @@ def create_app():
                     ]
                 })
 
-        return jsonify(payload)
+        response = jsonify(payload)
+        response.set_etag(etag)
+        return response
 
     @app.get("/stories/<int:story_id>/start")
     def get_story_start(story_id):
@@ -138,15 +325,120 @@ def create_app():
 
         return jsonify({"page_id": s.start_page_id})
 
+    @app.get("/stories/<int:story_id>/analysis")
+    def get_story_analysis(story_id):
+        s = Story.query.get(story_id)
+        if not s:
+            return error("Story not found", 404)
+
+        etag = f"analysis-{s.id}-v{s.version}"
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        response = jsonify(story_analysis.analyze_story(s))
+        response.set_etag(etag)
+        return response
+
+    @app.get("/stories/<int:story_id>/export")
+    def export_story(story_id):
+        s = Story.query.get(story_id)
+        if not s:
+            return error("Story not found", 404)
+
+        return app.response_class(
+            stream_with_context(story_transfer.export_lines(s.id)),
+            mimetype="application/x-ndjson",
+        )
+
+    @app.get("/stories/<int:story_id>/compiled")
+    def get_compiled_story_latest(story_id):
+        s = Story.query.get(story_id)
+        if not s or s.status != "published" or not s.compiled_version:
+            return error("No compiled version of this story", 404)
+
+        response = redirect(
+            url_for("get_compiled_story", story_id=s.id, version=s.compiled_version)
+        )
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    @app.get("/stories/<int:story_id>/compiled/<int:version>")
+    def get_compiled_story(story_id, version):
+        # a snapshot never changes once written, so it can be cached for good
+        etag = f"compiled-{story_id}-v{version}"
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        snapshot = story_snapshots.get_snapshot(story_id, version)
+        if not snapshot:
+            return error("Compiled story not found", 404)
+
+        if "gzip" in request.accept_encodings:
+            response = app.response_class(snapshot.data, mimetype="application/json")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = app.response_class(
+                gzip.decompress(snapshot.data), mimetype="application/json"
+            )
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        response.set_etag(etag)
+        return response
+
+    @app.get("/pages")
+    def list_pages():
+        ids = request.args.get("ids")
+        if ids is None:
+            return error("ids is required", 400)
+
+        id_list = parse_ids(ids)
+        if id_list is None:
+            return error("ids must be a comma-separated list of integers", 400)
+        if not id_list:
+            return jsonify([])
+
+        pages = Page.query.filter(Page.id.in_(id_list)).order_by(Page.id.asc()).all()
+        choices = (
+            Choice.query.filter(Choice.page_id.in_([p.id for p in pages]))
+            .order_by(Choice.id.asc())
+            .all()
+        )
+        choices_by_page = {}
+        for c in choices:
+            choices_by_page.setdefault(c.page_id, []).append(c)
+
+        return jsonify([
+            {
+                "id": p.id,
+                "story_id": p.story_id,
+                "text": p.text,
+                "is_ending": p.is_ending,
+                "ending_label": p.ending_label,
+                "choices": [
+                    {
+                        "id": c.id,
+                        "text": c.text,
+                        "next_page_id": c.next_page_id
+                    }
+                    for c in choices_by_page.get(p.id, [])
+                ]
+            }
+            for p in pages
+        ])
+
     @app.get("/pages/<int:page_id>")
     def get_page(page_id):
         p = Page.query.get(page_id)
         if not p:
             return error("Page not found", 404)
 
-        choices = Choice.query.filter_by(page_id=p.id).order_by(Choice.id.asc()).all()
+        etag = f"page-{p.id}-v{p.story.version}"
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
 
-        return jsonify({
+        choices = p.choices
+
+        response = jsonify({
             "id": p.id,
             "story_id": p.story_id,
             "text": p.text,
@@ -161,190 +453,84 @@ def create_app():
                 for c in choices
             ]
         })
+        response.set_etag(etag)
+        return response
 
     # WRITE ENDPOINTS 
 
-    @app.post("/stories")
-    def create_story():
+    def write_one(action, kind, op, code=200):
+        """
+        Run one create/update/delete through the batch handlers (batch.py),
+        which hold the validation for both these endpoints and /batch.
+        """
         block = require_api_key()
         if block:
             return block
 
         data = request.get_json(silent=True) or {}
+        try:
+            row, changes = story_batch.apply_one(action, kind, op, data)
+        except story_batch.NotFound as e:
+            db.session.rollback()
+            return error(str(e), 404)
+        except ValueError as e:
+            db.session.rollback()
+            return error(str(e), 400)
+        finish_writes(changes)
+        db.session.commit()
 
-        title = (data.get("title") or "").strip()
-        if not title:
-            return error("title is required", 400)
-
-        status = data.get("status", "draft")
-        if status not in VALID_STATUSES:
-            return error("Invalid status. Use draft/published/suspended", 400)
-
-        s = Story(
-            title=title,
-            description=data.get("description"),
-            status=status,
-            author_id=data.get("author_id"),
-            tags=normalize_tags(data.get("tags")),
-        )
+        return jsonify(serialize_row(kind, row)), code
 
-        db.session.add(s)
-        db.session.commit()
+    def finish_writes(changes):
+        """Versions, search rows and snapshots for the stories a write changed"""
+        for story_id in changes["story_ids"]:
+            if story_id not in changes["created_story_ids"]:
+                bump_version(story_id)
+        for story_id in changes["edited_story_ids"]:
+            story_search.index_story(story_id)
+        for story_id in changes["published_story_ids"]:
+            story_snapshots.publish(story_id)
 
-        return jsonify({
-                "id": s.id,
-                "title": s.title,
-                "description": s.description,
-                "status": s.status,
-                "start_page_id": s.start_page_id,
-                "author_id": s.author_id,
-                "tags": s.tags,
-            }
-        ), 201
+    @app.post("/stories")
+    def create_story():
+        return write_one("create", "story", {}, 201)
 
-    @app.put("/stories/<int:story_id>")
-    def update_story(story_id):
+    @app.post("/stories/import")
+    def import_story():
         block = require_api_key()
         if block:
             return block
 
-        s = Story.query.get(story_id)
-        if not s:
-            return error("Story not found", 404)
-
-        data = request.get_json(silent=True) or {}
-
-        if "title" in data:
-            new_title = (data.get("title") or "").strip()
-            if not new_title:
-                return error("title cannot be empty", 400)
-            s.title = new_title
-
-        if "description" in data:
-            s.description = data.get("description")
-
-        if "status" in data:
-            new_status = data.get("status")
-            if new_status not in VALID_STATUSES:
-                return error("Invalid status. Use draft/published/suspended", 400)
-            s.status = new_status
-
-        if "start_page_id" in data:
-            s.start_page_id = data.get("start_page_id")
-
-        if "author_id" in data:
-            s.author_id = data.get("author_id")
-
-        if "tags" in data:
-            s.tags = normalize_tags(data.get("tags"))
-
+        try:
+            if request.mimetype == "application/x-ndjson":
+                parsed = story_transfer.parse_ndjson(io.BufferedReader(request.stream))
+            else:
+                parsed = story_transfer.parse_document(request.get_json(silent=True))
+            s, ids_by_ref = story_transfer.import_story(*parsed)
+        except ValueError as e:
+            db.session.rollback()
+            return error(str(e), 400)
         db.session.commit()
 
-        return jsonify({
-                "id": s.id,
-                "title": s.title,
-                "description": s.description,
-                "status": s.status,
-                "start_page_id": s.start_page_id,
-                "author_id": s.author_id,
-                "tags": s.tags,
-            }
-        )
+        payload = serialize_story(s)
+        payload["page_ids"] = ids_by_ref
+        return jsonify(payload), 201
+
+    @app.put("/stories/<int:story_id>")
+    def update_story(story_id):
+        return write_one("update", "story", {"id": story_id})
 
     @app.delete("/stories/<int:story_id>")
     def delete_story(story_id):
-        block = require_api_key()
-        if block:
-            return block
-
-        s = Story.query.get(story_id)
-        if not s:
-            return error("Story not found", 404)
-
-        pages = Page.query.filter_by(story_id=s.id).all()
-        page_ids = [p.id for p in pages]
-
-        if page_ids:
-            Choice.query.filter(Choice.page_id.in_(page_ids)).delete(synchronize_session=False)
-
-        Page.query.filter_by(story_id=s.id).delete(synchronize_session=False)
-
-        db.session.delete(s)
-        db.session.commit()
-
-        return jsonify({"deleted": True})
+        return write_one("delete", "story", {"id": story_id})
 
     @app.post("/stories/<int:story_id>/pages")
     def create_page(story_id):
-        block = require_api_key()
-        if block:
-            return block
-
-        s = Story.query.get(story_id)
-        if not s:
-            return error("Story not found", 404)
-
-        data = request.get_json(silent=True) or {}
-        text = (data.get("text") or "").strip()
-        if not text:
-            return error("text is required", 400)
-
-        p = Page(
-            story_id=story_id,
-            text=text,
-            is_ending=bool(data.get("is_ending", False)),
-            ending_label=data.get("ending_label"),
-        )
-        db.session.add(p)
-        db.session.commit()
-
-        if not s.start_page_id:
-            s.start_page_id = p.id
-            db.session.commit()
-
-        return jsonify({
-                "id": p.id,
-                "story_id": p.story_id,
-                "text": p.text,
-                "is_ending": p.is_ending,
-                "ending_label": p.ending_label
-            }
-        ), 201
+        return write_one("create", "page", {"story_id": story_id}, 201)
 
     @app.put("/pages/<int:page_id>")
     def update_page(page_id):
-        block = require_api_key()
-        if block:
-            return block
-
-        p = Page.query.get(page_id)
-        if not p:
-            return error("Page not found", 404)
-
-        data = request.get_json(silent=True) or {}
-
-        if "text" in data:
-            new_text = (data.get("text") or "").strip()
-            if not new_text:
-                return error("text cannot be empty", 400)
-            p.text = new_text
-
-        if "is_ending" in data:
-            p.is_ending = bool(data.get("is_ending"))
-
-        if "ending_label" in data:
-            p.ending_label = data.get("ending_label")
-
-        db.session.commit()
-
-        return jsonify({
-                "id": p.id,
-                "story_id": p.story_id,
-                "text": p.text,
-                "is_ending": p.is_ending,
-                "ending_label": p.ending_label
-            }
-        )
+        return write_one("update", "page", {"id": page_id})
 
     @app.delete("/pages/<int:page_id>")
     def delete_page(page_id):
@@ -356,113 +542,78 @@ def create_app():
         if not p:
             return error("Page not found", 404)
 
-        Choice.query.filter_by(page_id=p.id).delete(synchronize_session=False)
-
-        s = Story.query.get(p.story_id)
-        if s and s.start_page_id == p.id:
-            s.start_page_id = None
-
-        db.session.delete(p)
+        story_id = p.story_id
+        linking_pages = story_batch.remove_page(p.id)
+        bump_version(story_id)
         db.session.commit()
-        return jsonify({"deleted": True})
+        # like /batch: every page whose cached copy changed, the deleted one
+        # and those that lost a choice leading to it
+        return jsonify(
+            {"deleted": True, "story_id": story_id, "page_ids": [page_id, *linking_pages]}
+        )
 
     @app.post("/pages/<int:page_id>/choices")
     def create_choice(page_id):
-        block = require_api_key()
-        if block:
-            return block
-
-        p = Page.query.get(page_id)
-        if not p:
-            return error("Page not found", 404)
-
-        data = request.get_json(silent=True) or {}
-
-        text = (data.get("text") or "").strip()
-        next_page_id = data.get("next_page_id")
-
-        if not text:
-            return error("text is required", 400)
-        if not isinstance(next_page_id, int):
-            return error("next_page_id must be an integer", 400)
-
-        next_page = Page.query.get(next_page_id)
-        if not next_page:
-            return error("next_page_id does not exist", 400)
-        if next_page.story_id != p.story_id:
-            return error("next_page_id must belong to the same story", 400)
-
-        c = Choice(page_id=page_id, text=text, next_page_id=next_page_id)
-        db.session.add(c)
-        db.session.commit()
-
-        return jsonify({
-                "id": c.id,
-                "page_id": c.page_id,
-                "text": c.text,
-                "next_page_id": c.next_page_id
-            }
-        ), 201
+        return write_one("create", "choice", {"page_id": page_id}, 201)
 
     @app.put("/choices/<int:choice_id>")
     def update_choice(choice_id):
+        return write_one("update", "choice", {"id": choice_id})
+
+    @app.delete("/choices/<int:choice_id>")
+    def delete_choice(choice_id):
+        return write_one("delete", "choice", {"id": choice_id})
+
+    @app.post("/batch")
+    def batch_write():
+        """
+        Apply an ordered list of create/update/delete operations on stories,
+        pages and choices in one transaction (see batch.py). All or nothing:
+        the first failing operation rolls the whole batch back.
+        """
         block = require_api_key()
         if block:
             return block
 
-        c = Choice.query.get(choice_id)
-        if not c:
-            return error("Choice not found", 404)
-
         data = request.get_json(silent=True) or {}
-
-        if "text" in data:
-            new_text = (data.get("text") or "").strip()
-            if not new_text:
-                return error("text cannot be empty", 400)
-            c.text = new_text
-
-        if "next_page_id" in data:
-            new_next_id = data.get("next_page_id")
-            if not isinstance(new_next_id, int):
-                return error("next_page_id must be an integer", 400)
-
-            next_page = Page.query.get(new_next_id)
-            if not next_page:
-                return error("next_page_id does not exist", 400)
-
-            current_page = Page.query.get(c.page_id)
-            if not current_page:
-                return error("Choice page not found", 400)
-
-            if next_page.story_id != current_page.story_id:
-                return error("next_page_id must belong to the same story", 400)
-
-            c.next_page_id = new_next_id
-
+        try:
+            results, changes = story_batch.apply_batch(data.get("operations"))
+        except story_batch.BatchError as e:
+            db.session.rollback()
+            return jsonify({"error": str(e), "index": e.index}), e.code
+        finish_writes(changes)
         db.session.commit()
 
         return jsonify({
-                "id": c.id,
-                "page_id": c.page_id,
-                "text": c.text,
-                "next_page_id": c.next_page_id
-            }
-        )
-
-    @app.delete("/choices/<int:choice_id>")
-    def delete_choice(choice_id):
-        block = require_api_key()
-        if block:
-            return block
-
-        c = Choice.query.get(choice_id)
-        if not c:
-            return error("Choice not found", 404)
+            "results": [serialize_row(kind, row) for kind, row in results],
+            "story_ids": sorted(changes["story_ids"]),
+            "page_ids": sorted(changes["page_ids"]),
+        })
 
-        db.session.delete(c)
-        db.session.commit()
-        return jsonify({"deleted": True})
+    def serialize_row(kind, row):
+        # rows removed by a later operation in the same batch report as deleted
+        if row is None or inspect(row).was_deleted:
+            return {"deleted": True}
+        try:
+            row.id
+        except ObjectDeletedError:
+            return {"deleted": True}
+        if kind == "story":
+            return serialize_story(row)
+        if kind == "page":
+            return {
+                "id": row.id,
+                "story_id": row.story_id,
+                "text": row.text,
+                "is_ending": row.is_ending,
+                "ending_label": row.ending_label,
+            }
+        return {
+            "id": row.id,
+            "page_id": row.page_id,
+            "text": row.text,
+            "next_page_id": row.next_page_id,
+        }
 
     @app.get("/health")
     def health():
@@ -0,0 +1,355 @@
+from sqlalchemy import delete, or_, select, update
+
+from extensions import db
+from models import Story, Page, Choice, VALID_STATUSES, story_tags as story_tags_table
+import search as story_search
+import snapshots as story_snapshots
+import tags as story_tags
+
+# Transactional batch writes for POST /batch. An operation looks like
+#   {"op": "create" | "update" | "delete", "type": "story" | "page" | "choice",
+#    "id": ..., "story_id": ..., "page_id": ..., "ref": "name", "data": {...}}
+# "id" names the row to update or delete; "story_id" (pages) and "page_id"
+# (choices) name the parent of a row to create; "data" is the same body the
+# single-row endpoints take. A create may carry a "ref", and any later id in
+# the batch (including next_page_id / start_page_id) may be written "$name"
+# to point at the row it created. Operations run in order in the caller's
+# transaction; the first failure raises and the caller rolls back. The
+# single-row write endpoints run their one operation through the same
+# handlers (apply_one).
+MAX_OPS = 1000
+
+
+class BatchError(Exception):
+    def __init__(self, index, message, code=400):
+        super().__init__(f"op {index}: {message}")
+        self.index = index
+        self.code = code
+
+
+class NotFound(Exception):
+    pass
+
+
+def remove_story(story_id):
+    """
+    Delete a story with its pages, choices, tags, snapshots and search row in
+    the current transaction. Set-based DELETEs keyed on story_id: nothing is
+    loaded into Python, however many pages the story has.
+    """
+    db.session.flush()
+    story_search.remove_story(story_id)
+    story_pages = select(Page.id).where(Page.story_id == story_id)
+    _delete(
+        delete(Choice).where(
+            or_(Choice.page_id.in_(story_pages), Choice.next_page_id.in_(story_pages))
+        )
+    )
+    _delete(delete(Page).where(Page.story_id == story_id))
+    _delete(delete(story_tags_table).where(story_tags_table.c.story_id == story_id))
+    story_snapshots.remove_snapshots(story_id)
+    _delete(delete(Story).where(Story.id == story_id))
+    # rows loaded earlier in this session are gone now; don't hand them out
+    db.session.expire_all()
+
+
+def remove_page(page_id):
+    """
+    Delete a page, its choices, every choice leading to it and its search
+    row, and unset it as its story's start page. Returns the ids of the other pages that lost
+    a choice.
+    """
+    db.session.flush()
+    linking_pages = db.session.scalars(
+        select(Choice.page_id)
+        .where(Choice.next_page_id == page_id, Choice.page_id != page_id)
+        .distinct()
+    ).all()
+    _delete(
+        delete(Choice).where(or_(Choice.page_id == page_id, Choice.next_page_id == page_id))
+    )
+    db.session.execute(
+        update(Story)
+        .where(Story.start_page_id == page_id)
+        .values(start_page_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    _delete(delete(Page).where(Page.id == page_id))
+    story_search.remove_page(page_id)
+    db.session.expire_all()
+    return linking_pages
+
+
+def _delete(statement):
+    db.session.execute(statement.execution_options(synchronize_session=False))
+
+
+class _Batch:
+    def __init__(self):
+        self.refs = {}
+        self.created = set()  # story ids created in this batch
+        self.touched = set()  # story ids whose content changed
+        self.edited = set()  # story ids whose own row changed (search)
+        self.published = set()  # story ids (re)published, see snapshots.py
+        self.deleted = set()
+        self.pages = set()  # page ids whose text or choices changed
+
+    def resolve(self, value):
+        if isinstance(value, str) and value.startswith("$"):
+            if value[1:] not in self.refs:
+                raise ValueError(f"unknown ref {value}")
+            return self.refs[value[1:]]
+        return value
+
+    def get(self, model, value, label):
+        row_id = self.resolve(value)
+        row = db.session.get(model, row_id) if isinstance(row_id, int) else None
+        if row is None:
+            raise NotFound(f"{label} not found")
+        return row
+
+    def next_page(self, data, story_id):
+        next_page_id = self.resolve(data.get("next_page_id"))
+        if not isinstance(next_page_id, int):
+            raise ValueError("next_page_id must be an integer")
+        next_page = db.session.get(Page, next_page_id)
+        if not next_page:
+            raise ValueError("next_page_id does not exist")
+        if next_page.story_id != story_id:
+            raise ValueError("next_page_id must belong to the same story")
+        return next_page_id
+
+    # stories
+
+    def create_story(self, op, data):
+        title = (data.get("title") or "").strip()
+        if not title:
+            raise ValueError("title is required")
+        status = data.get("status", "draft")
+        if status not in VALID_STATUSES:
+            raise ValueError("Invalid status. Use draft/published/suspended")
+
+        s = Story(
+            title=title,
+            description=data.get("description"),
+            status=status,
+            author_id=data.get("author_id"),
+        )
+        story_tags.set_tags(s, data.get("tags"))
+        db.session.add(s)
+        db.session.flush()
+        self.created.add(s.id)
+        self.touched.add(s.id)
+        self.edited.add(s.id)
+        if status == "published":
+            self.published.add(s.id)
+        return s
+
+    def update_story(self, op, data):
+        s = self.get(Story, op.get("id"), "Story")
+
+        if "title" in data:
+            new_title = (data.get("title") or "").strip()
+            if not new_title:
+                raise ValueError("title cannot be empty")
+            s.title = new_title
+
+        if "description" in data:
+            s.description = data.get("description")
+
+        if "status" in data:
+            if data.get("status") not in VALID_STATUSES:
+                raise ValueError("Invalid status. Use draft/published/suspended")
+            if data.get("status") == "published" and s.status != "published":
+                self.published.add(s.id)
+            s.status = data.get("status")
+
+        # edits to a live story stay out of its compiled snapshot until the
+        # author publishes them with {"republish": true}
+        if data.get("republish") and s.status == "published":
+            self.published.add(s.id)
+
+        if "start_page_id" in data:
+            s.start_page_id = self.resolve(data.get("start_page_id"))
+
+        if "author_id" in data:
+            s.author_id = data.get("author_id")
+
+        if "tags" in data:
+            story_tags.set_tags(s, data.get("tags"))
+
+        self.touched.add(s.id)
+        self.edited.add(s.id)
+        return s
+
+    def delete_story(self, op, data):
+        story_id = self.get(Story, op.get("id"), "Story").id
+        remove_story(story_id)
+        self.deleted.add(story_id)
+        return None
+
+    # pages
+
+    def create_page(self, op, data):
+        s = self.get(Story, op.get("story_id"), "Story")
+        text = (data.get("text") or "").strip()
+        if not text:
+            raise ValueError("text is required")
+
+        p = Page(
+            story_id=s.id,
+            text=text,
+            is_ending=bool(data.get("is_ending", False)),
+            ending_label=data.get("ending_label"),
+        )
+        db.session.add(p)
+        db.session.flush()
+        if not s.start_page_id:
+            s.start_page_id = p.id
+        story_search.index_page(p.id)
+        self.touched.add(s.id)
+        return p
+
+    def update_page(self, op, data):
+        p = self.get(Page, op.get("id"), "Page")
+
+        if "text" in data:
+            new_text = (data.get("text") or "").strip()
+            if not new_text:
+                raise ValueError("text cannot be empty")
+            p.text = new_text
+            story_search.index_page(p.id)
+
+        if "is_ending" in data:
+            p.is_ending = bool(data.get("is_ending"))
+
+        if "ending_label" in data:
+            p.ending_label = data.get("ending_label")
+
+        self.touched.add(p.story_id)
+        self.pages.add(p.id)
+        return p
+
+    def delete_page(self, op, data):
+        p = self.get(Page, op.get("id"), "Page")
+        page_id, story_id = p.id, p.story_id
+        self.pages.update(remove_page(page_id))
+        self.pages.add(page_id)
+        self.touched.add(story_id)
+        return None
+
+    # choices
+
+    def create_choice(self, op, data):
+        p = self.get(Page, op.get("page_id"), "Page")
+        text = (data.get("text") or "").strip()
+        if not text:
+            raise ValueError("text is required")
+
+        c = Choice(page_id=p.id, text=text, next_page_id=self.next_page(data, p.story_id))
+        db.session.add(c)
+        db.session.flush()
+        self.touched.add(p.story_id)
+        self.pages.add(p.id)
+        return c
+
+    def update_choice(self, op, data):
+        c = self.get(Choice, op.get("id"), "Choice")
+        page = db.session.get(Page, c.page_id)
+        if not page:
+            raise ValueError("Choice page not found")
+
+        if "text" in data:
+            new_text = (data.get("text") or "").strip()
+            if not new_text:
+                raise ValueError("text cannot be empty")
+            c.text = new_text
+
+        if "next_page_id" in data:
+            c.next_page_id = self.next_page(data, page.story_id)
+
+        self.touched.add(page.story_id)
+        self.pages.add(page.id)
+        return c
+
+    def delete_choice(self, op, data):
+        c = self.get(Choice, op.get("id"), "Choice")
+        page = db.session.get(Page, c.page_id)
+        if page:
+            self.touched.add(page.story_id)
+        self.pages.add(c.page_id)
+        db.session.delete(c)
+        db.session.flush()
+        return None
+
+    def changes(self):
+        return {
+            "story_ids": self.touched - self.deleted,
+            "created_story_ids": self.created,
+            "edited_story_ids": self.edited - self.deleted,
+            "published_story_ids": self.published - self.deleted,
+            "page_ids": self.pages,
+        }
+
+
+def _handler(batch, action, kind):
+    if kind in {"story", "page", "choice"} and action in {"create", "update", "delete"}:
+        return getattr(batch, f"{action}_{kind}")
+    return None
+
+
+def apply_one(action, kind, op, data):
+    """
+    Run a single operation, for the single-row write endpoints. Returns the
+    row (None for deletes) and the changes as apply_batch does; raises
+    NotFound or ValueError, and the caller rolls back.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("data must be an object")
+    batch = _Batch()
+    row = _handler(batch, action, kind)(op, data)
+    db.session.flush()
+    return row, batch.changes()
+
+
+def apply_batch(ops):
+    """
+    Run the operations in order in the current transaction. Returns
+    [(type, row or None for deletes), ...] and the changes as
+    {"story_ids", "created_story_ids", "edited_story_ids",
+    "published_story_ids", "page_ids"}; the caller bumps versions, reindexes,
+    compiles snapshots and commits. Raises BatchError naming the first
+    operation that failed.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise BatchError(0, "operations must be a non-empty list")
+    if len(ops) > MAX_OPS:
+        raise BatchError(0, f"at most {MAX_OPS} operations per batch")
+
+    batch = _Batch()
+    results = []
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict):
+            raise BatchError(index, "every operation must be an object")
+        kind = op.get("type")
+        action = op.get("op")
+        handler = _handler(batch, action, kind)
+        if handler is None:
+            raise BatchError(index, "op must be create/update/delete and type story/page/choice")
+
+        data = op.get("data") or {}
+        if not isinstance(data, dict):
+            raise BatchError(index, "data must be an object")
+        try:
+            row = handler(op, data)
+        except NotFound as e:
+            raise BatchError(index, str(e), 404)
+        except ValueError as e:
+            raise BatchError(index, str(e))
+
+        if action == "create" and op.get("ref") is not None:
+            batch.refs[str(op["ref"])] = row.id
+        results.append((kind, row))
+
+    db.session.flush()
+    return results, batch.changes()
@@ -0,0 +1,141 @@
+"""
+Concurrency benchmark for the SQLite connection setup.
+
+Runs 50 reader threads (page and story reads) alongside a few writer threads
+(page edits) against a throwaway database through the test client, once
+with stock SQLite (rollback journal, reads and writes on the same pool) and
+once with WAL plus the dedicated writer and read-only pool, and prints
+throughput and p50/p99 latency for each:
+
+    python bench_concurrency.py [--readers 50] [--writers 5] [--seconds 10]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SETUPS = {
+    "stock": {"SQLITE_TUNED": "False"},
+    "wal + writer + read pool": {"SQLITE_TUNED": "True"},
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_setup(args):
+    """One measurement, in a fresh process so Config picks up the env"""
+    from app import create_app
+
+    client = create_app().test_client()
+    headers = {"X-API-KEY": "bench"}
+    story = {
+        "story": {"title": "Benchmark", "status": "published"},
+        "pages": [
+            {"ref": i, "text": f"Page {i}. " + "Lorem ipsum dolor sit amet. " * 8,
+             "choices": [{"text": "Go on", "next": (i + 1) % args.pages}]}
+            for i in range(args.pages)
+        ],
+    }
+    created = client.post("/stories/import", json=story, headers=headers).get_json()
+    story_id = created["id"]
+    page_ids = list(created["page_ids"].values())
+
+    latencies = {"read": [], "write": []}
+    errors = []
+    # starting 50+ threads one by one under load takes seconds, so they all
+    # wait here and the clock starts once every one of them is running
+    deadline = []
+    start = threading.Barrier(
+        args.readers + args.writers,
+        action=lambda: deadline.append(time.perf_counter() + args.seconds),
+    )
+
+    def worker(kind):
+        rng = random.Random()
+        local = []
+        start.wait()
+        while time.perf_counter() < deadline[0]:
+            page_id = rng.choice(page_ids)
+            started = time.perf_counter()
+            if kind == "write":
+                response = client.put(
+                    f"/pages/{page_id}", json={"text": f"Edited {started}"}, headers=headers
+                )
+            elif rng.random() < 0.2:
+                response = client.get(f"/stories/{story_id}?include_pages=true")
+            else:
+                response = client.get(f"/pages/{page_id}")
+            local.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        latencies[kind].extend(local)
+
+    threads = [threading.Thread(target=worker, args=("read",)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=worker, args=("write",)) for _ in range(args.writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(json.dumps({
+        kind: {
+            "count": len(values),
+            "per_second": len(values) / args.seconds,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+        for kind, values in latencies.items()
+    } | {"errors": len(errors)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=50)
+    parser.add_argument("--writers", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_setup(args)
+
+    for name, env in SETUPS.items():
+        workdir = tempfile.mkdtemp(prefix="bench-concurrency-")
+        env = {
+            **os.environ,
+            # one reader connection per request thread, as with gunicorn threads
+            "SQLITE_READ_POOL_SIZE": str(args.readers + args.writers),
+            **env,
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            "FLASK_API_KEY": "bench",
+        }
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", *sys.argv[1:]],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name}: {result['errors']} errors")
+        for kind in ("read", "write"):
+            r = result[kind]
+            print(
+                f"  {kind:5} {r['per_second']:8,.0f}/s  "
+                f"p50 {r['p50_ms']:7.1f} ms  p99 {r['p99_ms']:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
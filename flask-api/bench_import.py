@@ -0,0 +1,79 @@
+"""
+Benchmark for POST /stories/import and GET /stories/<id>/export.
+
+Builds a synthetic story (50k pages by default), imports it into a throwaway
+SQLite database through the test client, then streams it back out:
+
+    python bench_import.py [--pages 50000] [--choices 2]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+
+def build_story(pages, choices_per_page, seed=1):
+    rng = random.Random(seed)
+    lines = [json.dumps({"type": "story", "title": f"Benchmark ({pages} pages)",
+                         "status": "published", "tags": ["benchmark"], "start_page": 1})]
+    for ref in range(1, pages + 1):
+        lines.append(json.dumps({
+            "type": "page",
+            "ref": ref,
+            "text": f"Page {ref}. " + "Lorem ipsum dolor sit amet. " * 8,
+            "is_ending": ref % 25 == 0,
+            "ending_label": f"Ending {ref}" if ref % 25 == 0 else None,
+        }))
+    for ref in range(1, pages + 1):
+        if ref % 25 == 0:
+            continue
+        for _ in range(choices_per_page):
+            lines.append(json.dumps({
+                "type": "choice",
+                "page": ref,
+                "text": "Go on",
+                "next": rng.randint(1, pages),
+            }))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50000)
+    parser.add_argument("--choices", type=int, default=2, help="choices per page")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-import-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["FLASK_API_KEY"] = "bench"
+
+    from app import create_app
+
+    client = create_app().test_client()
+    body = build_story(args.pages, args.choices)
+    lines = body.count(b"\n")
+    print(f"payload: {len(body) / 1e6:.1f} MB, {lines} lines")
+
+    started = time.perf_counter()
+    response = client.post(
+        "/stories/import",
+        data=body,
+        headers={"X-API-KEY": "bench", "Content-Type": "application/x-ndjson"},
+    )
+    elapsed = time.perf_counter() - started
+    if response.status_code != 201:
+        raise SystemExit(f"import failed: {response.status_code} {response.get_data(as_text=True)}")
+    story_id = response.get_json()["id"]
+    print(f"import: {elapsed:.2f}s ({args.pages / elapsed:,.0f} pages/s)")
+
+    started = time.perf_counter()
+    response = client.get(f"/stories/{story_id}/export")
+    exported = sum(1 for _ in response.response)
+    elapsed = time.perf_counter() - started
+    print(f"export: {elapsed:.2f}s ({exported} lines)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark for the pages.story_id and choices.page_id indexes.
+
+Imports synthetic stories into a throwaway SQLite database, then serves
+GET /pages/<id> and GET /stories/<id>?include_pages=true through the test
+client, first with the story/page foreign key indexes dropped and then with
+them created again. Prints the query plan of every statement each endpoint
+runs and its median and p99 latency:
+
+    python bench_indexes.py [--stories 200] [--pages 500] [--requests 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def build_story(number, pages):
+    return {
+        "story": {"title": f"Benchmark {number}", "status": "published"},
+        "pages": [
+            {"ref": i, "text": f"Page {i}. " + "Lorem ipsum dolor sit amet. " * 8,
+             "choices": [{"text": "Go on", "next": (i + 1) % pages},
+                         {"text": "Go back", "next": (i - 1) % pages}]}
+            for i in range(pages)
+        ],
+    }
+
+
+def fk_indexes():
+    from models import Choice, Page
+
+    return [
+        index
+        for table, columns in ((Page.__table__, {"story_id"}),
+                               (Choice.__table__, {"page_id", "next_page_id"}))
+        for index in table.indexes
+        if {c.name for c in index.columns} <= columns
+    ]
+
+
+def query_plans(app, client, path):
+    """EXPLAIN QUERY PLAN for each statement one request sends"""
+    from sqlalchemy import event
+
+    from extensions import db
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", capture)
+    try:
+        client.get(path)
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", capture)
+
+    plans = []
+    with app.app_context():
+        raw = db.engine.raw_connection()
+        try:
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    continue
+                rows = raw.cursor().execute("EXPLAIN QUERY PLAN " + statement, parameters)
+                plans.append("; ".join(row[-1] for row in rows))
+        finally:
+            raw.close()
+    return plans
+
+
+def measure(app, client, label, story_ids, page_ids, requests):
+    rng = random.Random(1)
+    endpoints = {
+        "get_page": lambda: f"/pages/{rng.choice(page_ids)}",
+        "story_detail": lambda: f"/stories/{rng.choice(story_ids)}?include_pages=true",
+    }
+    print(f"\n{label}")
+    for name, path in endpoints.items():
+        for plan in query_plans(app, client, path()):
+            print(f"  {name:13} plan: {plan}")
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(path())
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        print(
+            f"  {name:13} p50 {percentile(latencies, 50) * 1000:8.2f} ms  "
+            f"p99 {percentile(latencies, 99) * 1000:8.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stories", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=500, help="pages per story")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-indexes-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["FLASK_API_KEY"] = "bench"
+
+    from app import create_app
+    from extensions import db
+
+    app = create_app()
+    client = app.test_client()
+
+    started = time.perf_counter()
+    story_ids, page_ids = [], []
+    for number in range(args.stories):
+        response = client.post(
+            "/stories/import", json=build_story(number, args.pages),
+            headers={"X-API-KEY": "bench"},
+        )
+        created = response.get_json()
+        story_ids.append(created["id"])
+        page_ids.extend(created["page_ids"].values())
+    print(
+        f"seeded {args.stories} stories, {len(page_ids):,} pages, "
+        f"{2 * len(page_ids):,} choices in {time.perf_counter() - started:.1f}s"
+    )
+
+    indexes = fk_indexes()
+    with app.app_context():
+        for index in indexes:
+            index.drop(bind=db.engine)
+    measure(app, client, "without indexes", story_ids, page_ids, args.requests)
+
+    with app.app_context():
+        for index in indexes:
+            index.create(bind=db.engine)
+    measure(app, client, "with indexes", story_ids, page_ids, args.requests)
+
+
+if __name__ == "__main__":
+    main()
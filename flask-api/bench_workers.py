@@ -0,0 +1,168 @@
+"""
+Throughput benchmark for the gunicorn launcher across worker counts.
+
+Starts gunicorn (gunicorn.conf.py) against a throwaway database once per
+worker count, loads it with client processes doing page and story reads
+over keep-alive HTTP connections, and prints requests per second and p50/p99
+latency for each count. Clients run on the same machine, so leave them some
+cores:
+
+    python bench_workers.py [--workers 1,2,4] [--clients 16] [--seconds 10]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+API_KEY = "bench"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+
+def seed(port, pages):
+    story = {
+        "story": {"title": "Benchmark", "status": "published"},
+        "pages": [
+            {"ref": i, "text": f"Page {i}. " + "Lorem ipsum dolor sit amet. " * 8,
+             "choices": [{"text": "Go on", "next": (i + 1) % pages}]}
+            for i in range(pages)
+        ],
+    }
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request(
+        "POST", "/stories/import", json.dumps(story),
+        {"Content-Type": "application/json", "X-API-KEY": API_KEY},
+    )
+    created = json.loads(conn.getresponse().read())
+    conn.close()
+    return created["id"], list(created["page_ids"].values())
+
+
+def client(port, story_id, page_ids, stop, results):
+    rng = random.Random()
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies, errors = [], 0
+    while time.time() < stop:
+        if rng.random() < 0.2:
+            path = f"/stories/{story_id}?include_pages=true"
+        else:
+            path = f"/pages/{rng.choice(page_ids)}"
+        started = time.perf_counter()
+        # a recycled worker (max_requests) drops its keep-alive connections;
+        # like any HTTP client, retry the GET once on a new connection
+        for attempt in range(2):
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                errors += response.status != 200
+                break
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+        else:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    results.put((latencies, errors))
+
+
+def run(workers, args):
+    workdir = tempfile.mkdtemp(prefix="bench-workers-")
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "FLASK_API_KEY": API_KEY,
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi:app",
+         "--workers", str(workers), "--bind", f"127.0.0.1:{port}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for(port)
+        story_id, page_ids = seed(port, args.pages)
+
+        results = multiprocessing.Queue()
+        stop = time.time() + args.seconds
+        clients = [
+            multiprocessing.Process(target=client, args=(port, story_id, page_ids, stop, results))
+            for _ in range(args.clients)
+        ]
+        for c in clients:
+            c.start()
+        latencies, errors = [], 0
+        for _ in clients:
+            values, failed = results.get()
+            latencies.extend(values)
+            errors += failed
+        for c in clients:
+            c.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "per_second": len(latencies) / args.seconds,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, max(1, cores // 2), cores})
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default=",".join(map(str, counts)),
+                        help="comma-separated worker counts (default: 1, 2, cores/2, cores)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{cores} cores, {args.clients} client processes")
+    for workers in [int(n) for n in args.workers.split(",")]:
+        r = run(workers, args)
+        print(
+            f"{workers:3} workers  {r['per_second']:8,.0f} req/s  "
+            f"p50 {r['p50_ms']:7.1f} ms  p99 {r['p99_ms']:8.1f} ms  "
+            f"{r['errors']} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
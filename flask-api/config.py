@@ -7,3 +7,26 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///site.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     API_KEY = os.getenv("FLASK_API_KEY", "")
+
+    # SQLite tuning (see extensions.init_sqlite); SQLITE_TUNED=False keeps
+    # stock SQLite: rollback journal, one shared connection pool
+    SQLITE_TUNED = os.getenv("SQLITE_TUNED", "True") == "True"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 30000))
+    # reads go through the memory map, shared by every connection and worker
+    # process via the OS page cache; the per-connection page cache stays small
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 2 * 1024))
+    # read-only connections per process: one per request thread (gunicorn
+    # threads) so readers do not queue; 0 sends reads through the writer too
+    SQLITE_READ_POOL_SIZE = int(
+        os.getenv("SQLITE_READ_POOL_SIZE", os.getenv("GUNICORN_THREADS", 4))
+    )
+
+    if SQLITE_TUNED and SQLALCHEMY_DATABASE_URI.startswith("sqlite"):
+        # one writer connection: concurrent writes wait their turn in the pool
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            "pool_size": 1,
+            "max_overflow": 0,
+            "pool_timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            "connect_args": {"check_same_thread": False},
+        }
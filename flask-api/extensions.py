@@ -1,3 +1,112 @@
+import os
+
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+# On SQLite the app talks to the database file through two engines: the
+# default one is the single writer (pool of one connection, so writers queue
+# in the pool instead of failing with "database is locked"), and a "reader"
+# engine holds a pool of read-only connections. With WAL journaling readers
+# never wait for the writer. A session reads through the reader pool until
+# it first writes (a flush or a DML statement); from then on, until the
+# transaction ends, everything goes through the writer so it sees its own
+# uncommitted changes. A write request so holds the one writer connection
+# only from its first write to its commit, not while it validates.
+_WRITING = "uses_writer"
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        reader = self._db.engines.get("reader") if bind is None else None
+        if reader is None or self.info.get(_WRITING) or self._flushing or _writes(clause):
+            self.info[_WRITING] = True
+            return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        return reader
+
+
+def _writes(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(("SELECT", "WITH"))
+    return False
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _back_to_reader(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_WRITING, None)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def sqlite_pragmas(config, read_only=False):
+    """PRAGMAs run on every new SQLite connection"""
+    pragmas = {
+        "busy_timeout": config["SQLITE_BUSY_TIMEOUT_MS"],
+        "mmap_size": config["SQLITE_MMAP_SIZE"],
+        "cache_size": -config["SQLITE_CACHE_SIZE_KB"],  # negative = KiB
+    }
+    if not read_only:
+        # safe with WAL: a power cut can lose the last commits, not corrupt
+        pragmas["synchronous"] = "NORMAL"
+    return pragmas
+
+
+def _on_connect(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def init_sqlite(app):
+    """
+    Tune the SQLite connections and add the read-only "reader" engine.
+    Call inside an app context, after db.init_app(); does nothing for other
+    databases.
+    """
+    writer = db.engine
+    if not app.config["SQLITE_TUNED"]:
+        return
+    if writer.dialect.name != "sqlite" or not writer.url.database:
+        return
+
+    _on_connect(writer, sqlite_pragmas(app.config))
+    # persistent: stored in the database file, so set once by the writer
+    with writer.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+    pool_size = app.config["SQLITE_READ_POOL_SIZE"]
+    if pool_size:
+        reader = create_engine(
+            f"sqlite:///file:{writer.url.database}?mode=ro&uri=true",
+            pool_size=pool_size,
+            max_overflow=0,
+            pool_timeout=app.config["SQLITE_BUSY_TIMEOUT_MS"] / 1000,
+            connect_args={"check_same_thread": False},
+        )
+        _on_connect(reader, sqlite_pragmas(app.config, read_only=True))
+        db.engines["reader"] = reader
+
+
+def dispose_after_fork():
+    """
+    Give processes forked from this one (pre-fork server workers) fresh
+    connection pools: pooled SQLite connections must not cross a fork. Call
+    inside an app context, after init_sqlite().
+    """
+    engines = list(db.engines.values())
+
+    def dispose():
+        for engine in engines:
+            # close=False: leave the parent's connections alone, just forget them
+            engine.dispose(close=False)
 
-db = SQLAlchemy()
+    os.register_at_fork(after_in_child=dispose)
@@ -1,6 +1,21 @@
 #from werkzeug.security import generate_password_hash
 from extensions import db
 
+# tag -> story lookups go through the tag_id index
+story_tags = db.Table(
+    "story_tags",
+    db.Column("story_id", db.Integer, db.ForeignKey("stories.id"), primary_key=True),
+    db.Column("tag_id", db.Integer, db.ForeignKey("tags.id"), primary_key=True, index=True),
+)
+
+class Tag(db.Model):
+    __tablename__ = "tags"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    slug = db.Column(db.String(100), nullable=False, unique=True)  # lower-cased name
+
+VALID_STATUSES = {"draft", "published", "suspended"}
+
 class Story(db.Model):
     __tablename__ = "stories"
     id = db.Column(db.Integer, primary_key=True)
@@ -8,20 +23,53 @@ class Story(db.Model):
     description = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), nullable=False, default="draft")  
     start_page_id = db.Column(db.Integer, nullable=True)  # pages.id
-    tags = db.Column(db.String(500), nullable=True)
-    author_id = db.Column(db.Integer, nullable=True)
+    tags = db.Column(db.String(500), nullable=True)  # display copy of tag_items
+    author_id = db.Column(db.Integer, nullable=True, index=True)
+    # changed on every write to the story, its pages or choices (ETags,
+    # caches); values come from a database-wide counter, see versions.py
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # version of the newest StorySnapshot, set while the story is published
+    compiled_version = db.Column(db.Integer, nullable=True)
+
+    pages = db.relationship(
+        "Page", backref="story", order_by="Page.id", lazy="select", passive_deletes=True
+    )
+    tag_items = db.relationship("Tag", secondary=story_tags, order_by="Tag.slug", lazy="select")
 
 class Page(db.Model):
     __tablename__ = "pages"
     id = db.Column(db.Integer, primary_key=True)
-    story_id = db.Column(db.Integer, db.ForeignKey("stories.id"), nullable=False)
+    story_id = db.Column(db.Integer, db.ForeignKey("stories.id"), nullable=False, index=True)
     text = db.Column(db.Text, nullable=False)
     is_ending = db.Column(db.Boolean, nullable=False, default=False)
     ending_label = db.Column(db.String(100), nullable=True)
 
+    # outgoing choices only; next_page_id is the other FK to pages
+    choices = db.relationship(
+        "Choice",
+        foreign_keys="Choice.page_id",
+        backref="page",
+        order_by="Choice.id",
+        lazy="select",
+        passive_deletes=True,
+    )
+
 class Choice(db.Model):
     __tablename__ = "choices"
     id = db.Column(db.Integer, primary_key=True)
-    page_id = db.Column(db.Integer, db.ForeignKey("pages.id"), nullable=False)
+    page_id = db.Column(db.Integer, db.ForeignKey("pages.id"), nullable=False, index=True)
     text = db.Column(db.String(200), nullable=False)
-    next_page_id = db.Column(db.Integer, db.ForeignKey("pages.id"), nullable=False)
+    next_page_id = db.Column(db.Integer, db.ForeignKey("pages.id"), nullable=False, index=True)
+
+class StorySnapshot(db.Model):
+    """Immutable compiled copy of a published story at one version (see snapshots.py)"""
+    __tablename__ = "story_snapshots"
+    story_id = db.Column(db.Integer, db.ForeignKey("stories.id"), primary_key=True)
+    version = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)  # gzipped compact JSON
+
+class VersionCounter(db.Model):
+    """Single row holding the last story version handed out (see versions.py)"""
+    __tablename__ = "version_counter"
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False)
@@ -0,0 +1,169 @@
+import re
+
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+# SQLite FTS5 indexes: story_search holds each story's title, description and
+# tags (rowid is the story id), page_search each page's text (rowid is the
+# page id). A write reindexes only the row it changed; matches are rolled up
+# to stories at query time. When FTS5 is not available (another database, or
+# an SQLite build without it) search falls back to LIKE in list_stories.
+_fts_enabled = False
+
+
+def fts_enabled():
+    return _fts_enabled
+
+
+def init_search():
+    """Create the FTS tables if needed; populate them the first time they appear."""
+    global _fts_enabled
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    with db.engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'page_search'")
+        ).first()
+        if not exists:
+            # older databases kept all page text in one story_search column
+            conn.execute(text("DROP TABLE IF EXISTS story_search"))
+        try:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS story_search "
+                "USING fts5(title, description, tags, tokenize='unicode61')"
+            ))
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS page_search "
+                "USING fts5(body, story_id UNINDEXED, tokenize='unicode61')"
+            ))
+        except OperationalError:
+            return
+
+    _fts_enabled = True
+    if not exists:
+        rebuild_search_index()
+        db.session.commit()
+
+
+def index_story(story_id):
+    """Refresh one story's title/description/tags row. Runs in the caller's transaction."""
+    if not _fts_enabled:
+        return
+    db.session.flush()
+    db.session.execute(
+        text(
+            "INSERT OR REPLACE INTO story_search (rowid, title, description, tags) "
+            "SELECT s.id, s.title, coalesce(s.description, ''), coalesce(s.tags, '') "
+            "FROM stories s WHERE s.id = :id"
+        ),
+        {"id": story_id},
+    )
+
+
+def index_page(page_id):
+    """Refresh one page's row. Runs in the caller's transaction."""
+    if not _fts_enabled:
+        return
+    db.session.flush()
+    db.session.execute(
+        text(
+            "INSERT OR REPLACE INTO page_search (rowid, body, story_id) "
+            "SELECT id, text, story_id FROM pages WHERE id = :id"
+        ),
+        {"id": page_id},
+    )
+
+
+def index_story_pages(story_id):
+    """Index every page of a new story (import) in one statement."""
+    if not _fts_enabled:
+        return
+    db.session.flush()
+    db.session.execute(
+        text(
+            "INSERT INTO page_search (rowid, body, story_id) "
+            "SELECT id, text, story_id FROM pages WHERE story_id = :id"
+        ),
+        {"id": story_id},
+    )
+
+
+def remove_page(page_id):
+    if not _fts_enabled:
+        return
+    db.session.execute(
+        text("DELETE FROM page_search WHERE rowid = :id"), {"id": page_id}
+    )
+
+
+def remove_story(story_id):
+    """Drop the story's rows; call it before its pages are deleted."""
+    if not _fts_enabled:
+        return
+    db.session.execute(
+        text("DELETE FROM story_search WHERE rowid = :id"), {"id": story_id}
+    )
+    db.session.execute(
+        text(
+            "DELETE FROM page_search WHERE rowid IN "
+            "(SELECT id FROM pages WHERE story_id = :id)"
+        ),
+        {"id": story_id},
+    )
+
+
+def rebuild_search_index():
+    """Re-index every story and page from scratch. Runs in the caller's transaction."""
+    if not _fts_enabled:
+        return 0
+    db.session.execute(text("DELETE FROM story_search"))
+    db.session.execute(text("DELETE FROM page_search"))
+    result = db.session.execute(
+        text(
+            "INSERT INTO story_search (rowid, title, description, tags) "
+            "SELECT id, title, coalesce(description, ''), coalesce(tags, '') FROM stories"
+        )
+    )
+    db.session.execute(
+        text(
+            "INSERT INTO page_search (rowid, body, story_id) "
+            "SELECT id, text, story_id FROM pages"
+        )
+    )
+    return result.rowcount
+
+
+def to_match_query(term):
+    """
+    Turn free text into a safe FTS5 query: every word must match, each as a
+    prefix ("drag" finds "dragon"). Returns None if there is nothing to match.
+    """
+    words = re.findall(r"\w+", term or "")
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def ranked_matches(match_query):
+    """
+    Subquery of (story_id, rank), best match first by bm25. A story matches
+    when its title/description/tags or any one of its pages match; its rank
+    is its best-ranked row.
+    """
+    return (
+        text(
+            "SELECT story_id, min(rank) AS rank FROM ("
+            "SELECT rowid AS story_id, rank FROM story_search "
+            "WHERE story_search MATCH :match "
+            "UNION ALL "
+            "SELECT story_id, rank FROM page_search "
+            "WHERE page_search MATCH :match"
+            ") GROUP BY story_id"
+        )
+        .bindparams(match=match_query)
+        .columns(story_id=Integer, rank=Float)
+        .subquery("search_hits")
+    )
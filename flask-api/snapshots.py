@@ -0,0 +1,117 @@
+import gzip
+import json
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Story, Page, Choice, StorySnapshot
+
+# Published stories are compiled into an immutable, versioned blob (gzipped
+# compact JSON) that the gameplay engine downloads once and walks locally.
+# (story_id, version) names one snapshot for the life of the database, even
+# across a deleted story's id being reused (versions.py).
+# A snapshot is compiled when a story becomes published and again when it is
+# republished ({"republish": true} on update); edits to a live story stay out
+# of its snapshot until then, so readers keep playing the pinned version.
+FORMAT = 1
+_PENDING = "snapshot_story_ids"
+
+
+def publish(story_id):
+    """Compile a new snapshot of the story when the current transaction commits."""
+    db.session.info.setdefault(_PENDING, set()).add(story_id)
+
+
+def compile_story(session, story_id, version, start_page_id):
+    """
+    The whole story as a packed document: pages in id order as
+    [id, text, is_ending, ending_label, [[choice_id, text, next_page_id], ...]].
+    """
+    pages = (
+        session.query(Page.id, Page.text, Page.is_ending, Page.ending_label)
+        .filter(Page.story_id == story_id)
+        .order_by(Page.id.asc())
+        .all()
+    )
+    choices = (
+        session.query(Choice.page_id, Choice.id, Choice.text, Choice.next_page_id)
+        .join(Page, Choice.page_id == Page.id)
+        .filter(Page.story_id == story_id)
+        .order_by(Choice.id.asc())
+    )
+    choices_by_page = {}
+    for page_id, choice_id, text, next_page_id in choices:
+        choices_by_page.setdefault(page_id, []).append([choice_id, text, next_page_id])
+
+    return {
+        "format": FORMAT,
+        "story_id": story_id,
+        "version": version,
+        "start_page_id": start_page_id,
+        "pages": [
+            [p.id, p.text, p.is_ending, p.ending_label, choices_by_page.get(p.id, [])]
+            for p in pages
+        ],
+    }
+
+
+def _write_snapshots(session, story_ids):
+    stories = (
+        session.query(Story.id, Story.version, Story.start_page_id, Story.compiled_version)
+        .filter(Story.id.in_(story_ids), Story.status == "published")
+        .all()
+    )
+    for s in stories:
+        if s.compiled_version == s.version:
+            continue
+        doc = compile_story(session, s.id, s.version, s.start_page_id)
+        blob = gzip.compress(json.dumps(doc, separators=(",", ":")).encode(), mtime=0)
+        session.merge(StorySnapshot(story_id=s.id, version=s.version, data=blob))
+        # keep the snapshot being replaced so clients that just read the old
+        # compiled_version can still fetch it; anything older goes
+        if s.compiled_version:
+            session.query(StorySnapshot).filter(
+                StorySnapshot.story_id == s.id,
+                StorySnapshot.version < s.compiled_version,
+            ).delete(synchronize_session=False)
+        session.query(Story).filter_by(id=s.id).update(
+            {Story.compiled_version: s.version}, synchronize_session=False
+        )
+    return len(stories)
+
+
+@event.listens_for(Session, "before_commit")
+def _compile_pending(session):
+    story_ids = session.info.pop(_PENDING, None)
+    if story_ids:
+        session.flush()
+        _write_snapshots(session, story_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+def get_snapshot(story_id, version):
+    return db.session.get(StorySnapshot, (story_id, version))
+
+
+def remove_snapshots(story_id):
+    StorySnapshot.query.filter_by(story_id=story_id).delete(synchronize_session=False)
+
+
+def backfill_snapshots():
+    """Compile published stories that have no snapshot yet (first run after upgrade)."""
+    story_ids = [
+        story_id
+        for (story_id,) in db.session.query(Story.id).filter(
+            Story.status == "published",
+            Story.compiled_version.is_(None),
+        )
+    ]
+    if story_ids:
+        _write_snapshots(db.session, story_ids)
+        db.session.commit()
+    return len(story_ids)
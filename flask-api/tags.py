@@ -0,0 +1,85 @@
+from sqlalchemy import func
+
+from extensions import db
+from models import Story, Tag, story_tags
+
+
+def split_tags(value):
+    """Tag names from a list or comma-separated string, de-duplicated case-insensitively."""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = str(value).split(",")
+    names = {}
+    for t in value:
+        name = str(t).strip()
+        if name:
+            names.setdefault(name.lower(), name)
+    return list(names.values())
+
+
+def set_story_tags(story, names):
+    """Point the story at the Tag rows for `names`, creating missing tags."""
+    slugs = [n.lower() for n in names]
+    existing = {t.slug: t for t in Tag.query.filter(Tag.slug.in_(slugs))} if slugs else {}
+    items = []
+    for name in names:
+        tag = existing.get(name.lower())
+        if tag is None:
+            tag = Tag(name=name, slug=name.lower())
+            db.session.add(tag)
+            existing[tag.slug] = tag
+        items.append(tag)
+    story.tag_items = items
+
+
+def set_tags(story, value):
+    """
+    Set a story's tags from a list or comma-separated string (Django sends
+    either): the tag rows and the Story.tags display copy.
+    """
+    names = split_tags(value)
+    story.tags = None if value is None else ",".join(names)
+    set_story_tags(story, names)
+
+
+def filter_by_tags(query, names, match_all=False):
+    """
+    Exact, case-insensitive tag filter via the story_tags index. Any tag
+    matches by default; with match_all the story must carry every tag.
+    """
+    slugs = list({n.lower() for n in names})
+    if not slugs:
+        return query
+    matching = (
+        db.session.query(story_tags.c.story_id)
+        .join(Tag, Tag.id == story_tags.c.tag_id)
+        .filter(Tag.slug.in_(slugs))
+    )
+    if match_all:
+        matching = matching.group_by(story_tags.c.story_id).having(
+            func.count(story_tags.c.tag_id) == len(slugs)
+        )
+    return query.filter(Story.id.in_(matching))
+
+
+def tag_counts(status=None):
+    """(name, story count) pairs for faceted browsing, most used first."""
+    q = (
+        db.session.query(Tag.name, func.count(story_tags.c.story_id).label("count"))
+        .join(story_tags, story_tags.c.tag_id == Tag.id)
+    )
+    if status:
+        q = q.join(Story, Story.id == story_tags.c.story_id).filter(Story.status == status)
+    return q.group_by(Tag.id, Tag.name).order_by(func.count(story_tags.c.story_id).desc(), Tag.slug).all()
+
+
+def backfill_tags():
+    """One-off: build story_tags from the legacy comma-separated Story.tags strings."""
+    if db.session.query(story_tags).first() is not None:
+        return 0
+    stories = Story.query.filter(Story.tags.isnot(None), Story.tags != "").all()
+    for s in stories:
+        set_story_tags(s, split_tags(s.tags))
+    db.session.commit()
+    return len(stories)
@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from extensions import db
+
+HEADERS = {"X-API-KEY": "test"}
+
+
+def import_story(client, pages, title="Story"):
+    doc = {
+        "story": {"title": title, "status": "published", "tags": ["test", "graph"]},
+        "pages": [
+            {"ref": i, "text": f"Page {i}",
+             "choices": [{"text": "Go on", "next": (i + 1) % pages},
+                         {"text": "Go back", "next": (i - 1) % pages}]}
+            for i in range(pages)
+        ],
+    }
+    response = client.post("/stories/import", json=doc, headers=HEADERS)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()["id"]
+
+
+@contextmanager
+def count_queries(app):
+    """Count the statements sent through every engine (writer and reader)."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def queries_for(app, client, url):
+    with count_queries(app) as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_story_detail_query_count_does_not_grow_with_pages(app, client):
+    small = import_story(client, pages=2)
+    large = import_story(client, pages=2000)
+
+    for suffix in ("", "?include_pages=true"):
+        assert queries_for(app, client, f"/stories/{small}{suffix}") == queries_for(
+            app, client, f"/stories/{large}{suffix}"
+        )
+
+    response = client.get(f"/stories/{large}?include_pages=true")
+    assert len(response.get_json()["pages"]) == 2000
+
+
+def import_stories(client, count, author_id):
+    for i in range(count):
+        response = client.post(
+            "/stories/import",
+            json={"story": {"title": f"Story {i}", "status": "published",
+                            "author_id": author_id, "tags": [f"tag{i}", "shared"]},
+                  "pages": [{"ref": 0, "text": "Only page"}]},
+            headers=HEADERS,
+        )
+        assert response.status_code == 201, response.get_json()
+
+
+def test_story_listing_query_count_does_not_grow_with_stories(app, client):
+    for author_id, include in ((1001, ""), (1002, "page_counts")):
+        url = f"/stories?author_id={author_id}&include={include}"
+
+        import_stories(client, 1, author_id)
+        one = queries_for(app, client, url)
+        import_stories(client, 50, author_id)
+        many = queries_for(app, client, url)
+
+        assert one == many
+        assert len(client.get(url).get_json()) == 51
@@ -0,0 +1,225 @@
+import json
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import Story, Page, Choice, VALID_STATUSES
+import search as story_search
+import snapshots as story_snapshots
+import tags as story_tags
+
+# Whole-story import/export. The export format is NDJSON: one "story" line,
+# then one line per page and per choice. Pages carry a "ref" (their id in the
+# source database) and choices point at refs, so the same lines can be posted
+# back to /stories/import. Import also takes a single JSON document:
+#   {"story": {...}, "start_page": ref, "pages": [{"ref": ..., "text": ...,
+#    "choices": [{"text": ..., "next": ref}]}]}
+BATCH_SIZE = 1000
+
+
+def parse_document(doc):
+    """Flatten a JSON import document into (story, start_ref, pages, choices)."""
+    if not isinstance(doc, dict) or not isinstance(doc.get("pages"), list):
+        raise ValueError("pages must be a list")
+    pages = []
+    choices = []
+    for page in doc["pages"]:
+        if not isinstance(page, dict):
+            raise ValueError("every page must be an object")
+        pages.append(page)
+        for choice in page.get("choices") or []:
+            if not isinstance(choice, dict):
+                raise ValueError("every choice must be an object")
+            choices.append({**choice, "page": page.get("ref")})
+    story = doc.get("story") or {}
+    if not isinstance(story, dict):
+        raise ValueError("story must be an object")
+    return story, doc.get("start_page"), pages, choices
+
+
+def parse_ndjson(lines):
+    """Read export lines back into (story, start_ref, pages, choices)."""
+    story = None
+    pages = []
+    choices = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {number} is not valid JSON")
+        kind = item.get("type") if isinstance(item, dict) else None
+        if kind == "story":
+            story = item
+        elif kind == "page":
+            pages.append(item)
+        elif kind == "choice":
+            choices.append(item)
+        else:
+            raise ValueError(f"line {number}: type must be story, page or choice")
+    if story is None:
+        raise ValueError("missing story line")
+    return story, story.get("start_page"), pages, choices
+
+
+def _ref(value):
+    # refs may come as numbers (exported ids) or strings (client temp ids)
+    return str(value) if value is not None else None
+
+
+def _text(value, what):
+    # validated here so a number or a list is a 400, not a 500 at .strip()
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"{what} must be a string")
+    return value.strip()
+
+
+def import_story(story_data, start_ref, pages, choices, author_id=None):
+    """
+    Create the story, its pages and its choices in the current transaction:
+    pages and choices in batched executemany inserts, the page inserts
+    returning their new ids in order. Returns the new Story and {ref: page id};
+    the caller commits.
+    """
+    title = _text(story_data.get("title"), "story title")
+    if not title:
+        raise ValueError("story title is required")
+    status = story_data.get("status", "draft")
+    if status not in VALID_STATUSES:
+        raise ValueError("Invalid status. Use draft/published/suspended")
+    if not pages:
+        raise ValueError("a story needs at least one page")
+
+    refs = []
+    page_rows = []
+    for page in pages:
+        ref = _ref(page.get("ref"))
+        if ref is None:
+            raise ValueError("every page needs a ref")
+        text = _text(page.get("text"), f"page {ref}: text")
+        if not text:
+            raise ValueError(f"page {ref}: text is required")
+        ending_label = page.get("ending_label")
+        if ending_label is not None and not isinstance(ending_label, str):
+            raise ValueError(f"page {ref}: ending_label must be a string")
+        refs.append(ref)
+        page_rows.append(
+            {
+                "text": text,
+                "is_ending": bool(page.get("is_ending", False)),
+                "ending_label": ending_label,
+            }
+        )
+    if len(set(refs)) != len(refs):
+        raise ValueError("page refs must be unique")
+    known = set(refs)
+
+    for choice in choices:
+        if _ref(choice.get("page")) not in known:
+            raise ValueError(f"choice from unknown page ref {choice.get('page')}")
+        if _ref(choice.get("next")) not in known:
+            raise ValueError(f"choice to unknown page ref {choice.get('next')}")
+        text = _text(choice.get("text"), "choice text")
+        if not text:
+            raise ValueError("every choice needs text")
+
+    start_ref = _ref(start_ref) if start_ref is not None else refs[0]
+    if start_ref not in known:
+        raise ValueError(f"start_page {start_ref} is not one of the pages")
+
+    description = story_data.get("description")
+    if description is not None and not isinstance(description, str):
+        raise ValueError("story description must be a string")
+
+    s = Story(
+        title=title,
+        description=description,
+        status=status,
+        author_id=author_id if author_id is not None else story_data.get("author_id"),
+    )
+    story_tags.set_tags(s, story_data.get("tags"))
+    db.session.add(s)
+    db.session.flush()
+
+    for row in page_rows:
+        row["story_id"] = s.id
+    # RETURNING gets slow on one huge executemany, so insert in chunks
+    new_ids = []
+    for i in range(0, len(page_rows), BATCH_SIZE):
+        new_ids += db.session.scalars(
+            insert(Page).returning(Page.id, sort_by_parameter_order=True),
+            page_rows[i:i + BATCH_SIZE],
+        ).all()
+    ids_by_ref = dict(zip(refs, new_ids))
+
+    for i in range(0, len(choices), BATCH_SIZE):
+        db.session.execute(
+            insert(Choice),
+            [
+                {
+                    "page_id": ids_by_ref[_ref(c.get("page"))],
+                    "text": c["text"].strip(),
+                    "next_page_id": ids_by_ref[_ref(c.get("next"))],
+                }
+                for c in choices[i:i + BATCH_SIZE]
+            ],
+        )
+
+    s.start_page_id = ids_by_ref[start_ref]
+    db.session.flush()
+    story_search.index_story(s.id)
+    story_search.index_story_pages(s.id)
+    if status == "published":
+        story_snapshots.publish(s.id)
+    return s, ids_by_ref
+
+
+def export_lines(story_id):
+    """
+    NDJSON lines for the story, streamed from the database in batches. Loads
+    the story itself: the generator outlives the view's session.
+    """
+    story = db.session.get(Story, story_id)
+    yield json.dumps({
+        "type": "story",
+        "title": story.title,
+        "description": story.description,
+        "status": story.status,
+        "author_id": story.author_id,
+        "tags": [t.name for t in story.tag_items],
+        "start_page": story.start_page_id,
+    }) + "\n"
+
+    pages = (
+        db.session.query(Page.id, Page.text, Page.is_ending, Page.ending_label)
+        .filter(Page.story_id == story_id)
+        .order_by(Page.id.asc())
+        .yield_per(BATCH_SIZE)
+    )
+    for p in pages:
+        yield json.dumps({
+            "type": "page",
+            "ref": p.id,
+            "text": p.text,
+            "is_ending": p.is_ending,
+            "ending_label": p.ending_label,
+        }) + "\n"
+
+    choices = (
+        db.session.query(Choice.page_id, Choice.text, Choice.next_page_id)
+        .join(Page, Choice.page_id == Page.id)
+        .filter(Page.story_id == story_id)
+        .order_by(Choice.id.asc())
+        .yield_per(BATCH_SIZE)
+    )
+    for c in choices:
+        yield json.dumps({
+            "type": "choice",
+            "page": c.page_id,
+            "text": c.text,
+            "next": c.next_page_id,
+        }) + "\n"
@@ -0,0 +1,42 @@
+import time
+
+from sqlalchemy import event, func, update
+from sqlalchemy.dialects.sqlite import insert
+
+from extensions import db
+from models import Story, VersionCounter
+
+# Story versions come from one database-wide counter instead of counting up
+# per story. ETags, snapshots, the analysis cache and Django's caches all key
+# on (story id, version), and story ids are reused once the highest one is
+# deleted (INTEGER PRIMARY KEY without AUTOINCREMENT): with per-story counters
+# a new story would repeat pairs that clients still hold for the deleted one.
+
+
+def next_version(conn):
+    """Take a version number no story has had; conn is a session or connection"""
+    return conn.execute(
+        update(VersionCounter)
+        .values(value=VersionCounter.value + 1)
+        .returning(VersionCounter.value)
+    ).scalar_one()
+
+
+@event.listens_for(Story, "before_insert")
+def _first_version(mapper, connection, target):
+    target.version = next_version(connection)
+
+
+def init_versions():
+    """
+    Create the counter row on first run. It starts above every existing
+    version and at the current Unix time, so versions handed out by the old
+    per-story counters (and maybe still cached by clients) are not reissued.
+    """
+    highest = db.session.query(func.max(Story.version)).scalar() or 0
+    db.session.execute(
+        insert(VersionCounter)
+        .values(id=1, value=max(highest, int(time.time())))
+        .on_conflict_do_nothing()
+    )
+    db.session.commit()